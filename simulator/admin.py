@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import InteractionLog, UserProfile, PracticeSession, PracticeSessionMessage
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+from .models import InteractionLog, UserProfile, PracticeSession
 
 
 @admin.register(InteractionLog)
@@ -15,15 +17,17 @@ class UserProfileAdmin(admin.ModelAdmin):
     search_fields = ('user__username',)
 
 
-class PracticeSessionMessageInline(admin.TabularInline):
-    model = PracticeSessionMessage
-    extra = 0
-    ordering = ['order']
-
-
 @admin.register(PracticeSession)
 class PracticeSessionAdmin(admin.ModelAdmin):
     list_display = ('user', 'scenario', 'ended_at', 'total_messages', 'kind_moments', 'flagged_count', 'hurt_moments')
     list_filter = ('scenario',)
     search_fields = ('user__username',)
-    inlines = [PracticeSessionMessageInline]
+    readonly_fields = ('transcript_lines',)
+
+    @admin.display(description='Transcript')
+    def transcript_lines(self, session):
+        # Decoded from the compact blob or read from the message rows, whichever the session uses
+        return format_html_join(
+            mark_safe('<br>'), '<b>{}</b>{}: {}',
+            ((m['sender'], ' [{}]'.format(m['mood']) if m['mood'] else '', m['text']) for m in session.transcript),
+        )
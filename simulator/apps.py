@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class SimulatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'simulator'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_delete, post_save, pre_delete
+        from rest_framework.authtoken.models import Token
+
+        from . import authentication
+
+        # Keep the token cache (simulator/authentication.py) from serving revoked or changed users
+        post_delete.connect(authentication.token_deleted, sender=Token, dispatch_uid='simulator_token_deleted')
+        post_save.connect(authentication.user_changed, sender=settings.AUTH_USER_MODEL,
+                          dispatch_uid='simulator_user_saved')
+        pre_delete.connect(authentication.user_changed, sender=settings.AUTH_USER_MODEL,
+                           dispatch_uid='simulator_user_deleted')
@@ -0,0 +1,68 @@
+"""
+Token authentication with a short-lived cache of token -> user.
+
+DRF's TokenAuthentication joins authtoken_token and auth_user on every request. This
+backend keeps the resolved user in the default cache for AUTH_TOKEN_CACHE_TTL seconds.
+Call invalidate_token() when a token is revoked or rotated; deleting a Token and saving
+or deleting its user do that automatically (signals connected in SimulatorConfig.ready),
+so password changes and deactivation take effect at once rather than after the TTL.
+
+That only holds when every process sees the same cache, so the lookup cache is used only
+with a shared default backend (caching.is_shared); with the per-process LocMemCache every
+request checks the token in the database, as TokenAuthentication does.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from . import caching
+
+
+def _key(token_key):
+    # Hash so raw tokens never end up in a shared cache backend
+    return "authtoken:" + hashlib.sha256(token_key.encode("utf-8")).hexdigest()
+
+
+def _ttl():
+    return getattr(settings, "AUTH_TOKEN_CACHE_TTL", 60)
+
+
+def enabled():
+    return _ttl() > 0 and caching.is_shared()
+
+
+def invalidate_token(token_key):
+    """Forget the cached user for this token (logout, rotation, revocation)."""
+    cache.delete(_key(token_key))
+
+
+def invalidate_user(user):
+    """Forget cached lookups for every token belonging to `user`."""
+    for token_key in Token.objects.filter(user=user).values_list("key", flat=True):
+        invalidate_token(token_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        if not enabled():
+            return super().authenticate_credentials(key)
+        user = cache.get(_key(key))
+        if user is not None:
+            return (user, None)
+        user, token = super().authenticate_credentials(key)
+        cache.set(_key(key), user, _ttl())
+        return (user, token)
+
+
+def token_deleted(sender, instance, **kwargs):
+    if enabled():
+        invalidate_token(instance.key)
+
+
+def user_changed(sender, instance, **kwargs):
+    if enabled():
+        invalidate_user(instance)
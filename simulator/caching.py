@@ -0,0 +1,16 @@
+"""
+Whether the default Django cache is shared between processes.
+
+Caches whose entries must be invalidated everywhere at once (token lookups, profile
+snapshots) are only used with a shared backend (Redis, Memcached, database, file). The
+default LocMemCache lives inside one process, so a delete made by the worker that handled
+a change would leave stale entries in every other worker; with it those caches are off.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared():
+    """False when the default cache is per-process (LocMemCache) or stores nothing (DummyCache)."""
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
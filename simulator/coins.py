@@ -0,0 +1,94 @@
+"""
+Coin balance changes without read-modify-write races.
+
+Balances change only through conditional F-expression UPDATEs (a redemption decrements
+only where coins >= cost), so double clicks and parallel tabs cannot lose an award or
+spend the same coins twice. Every change is appended to the CoinTransaction ledger in the
+same transaction; the UPDATE is the first statement, so the profile row is locked only for
+the few statements that follow it. The cached profile snapshot is dropped on commit.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from . import profile_cache
+from .models import CoinTransaction, UserProfile
+
+
+class InsufficientCoins(Exception):
+    def __init__(self, coins):
+        super().__init__("Not enough coins")
+        self.coins = coins
+
+
+class AlreadyOwned(Exception):
+    def __init__(self, coins):
+        super().__init__("Already owned")
+        self.coins = coins
+
+
+def get_or_create_profile(user):
+    profile, _ = UserProfile.objects.get_or_create(user=user, defaults={"coins": 0})
+    return profile
+
+
+def _balance(user):
+    return UserProfile.objects.filter(user=user).values_list("coins", flat=True).get()
+
+
+def award(user, amount):
+    """Add `amount` coins and return the new balance."""
+    get_or_create_profile(user)
+    with transaction.atomic():
+        UserProfile.objects.filter(user=user).update(coins=F("coins") + amount)
+        coins = _balance(user)
+        CoinTransaction.objects.create(user=user, kind="award", amount=amount, balance_after=coins)
+        profile_cache.invalidate(user.pk)
+    return coins
+
+
+def redeem(user, reward):
+    """
+    Spend reward["cost"] coins on `reward`. Returns (coins, purchased_reward_ids);
+    raises InsufficientCoins or AlreadyOwned (nothing is changed then).
+    """
+    get_or_create_profile(user)
+    cost = reward["cost"]
+    try:
+        with transaction.atomic():
+            if not UserProfile.objects.filter(user=user, coins__gte=cost).update(coins=F("coins") - cost):
+                raise InsufficientCoins(_balance(user))
+            # The UPDATE above holds the row lock, so this read and write of the JSON list cannot interleave
+            profile = UserProfile.objects.get(user=user)
+            purchased = list(profile.purchased_reward_ids or [])
+            if reward["id"] in purchased:
+                raise AlreadyOwned(profile.coins + cost)
+            purchased.append(reward["id"])
+            UserProfile.objects.filter(user=user).update(purchased_reward_ids=purchased)
+            CoinTransaction.objects.create(
+                user=user, kind="redeem", amount=-cost, balance_after=profile.coins, reward_id=reward["id"],
+            )
+            profile_cache.invalidate(user.pk)
+    except IntegrityError:
+        # The ledger's one-redemption-per-reward constraint caught a duplicate
+        raise AlreadyOwned(_balance(user))
+    return profile.coins, purchased
+
+
+def ledger_balances(user_ids=None):
+    """{user_id: sum of ledger amounts} for the given users (all by default)."""
+    rows = CoinTransaction.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    return dict(rows.order_by().values("user_id").annotate(total=Sum("amount")).values_list("user_id", "total"))
+
+
+def mismatches(user_ids=None):
+    """Yield (user_id, profile_coins, ledger_total) for every balance the ledger does not add up to."""
+    ledger = ledger_balances(user_ids)
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+    for user_id, coins in profiles.order_by("user_id").values_list("user_id", "coins"):
+        total = ledger.get(user_id, 0)
+        if total != coins:
+            yield user_id, coins, total
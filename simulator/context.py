@@ -0,0 +1,112 @@
+"""
+Token-budgeted prompt history for the roleplay call.
+
+Recent turns are kept verbatim, newest first, until HISTORY_TOKEN_BUDGET is used up.
+Older turns are folded into a short rolling summary that is updated incrementally in
+the background (one LLM call per SUMMARY_BATCH_TURNS evicted turns) and cached by
+conversation id, so prompt size stays roughly constant however long a session runs. A
+summary evicted from the cache is rebuilt from the conversation's held turns.
+
+Tokens are counted with Mistral's tokenizer when `mistral-common` is installed,
+otherwise with a ~4 characters per token estimate.
+"""
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics, utils
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        try:
+            from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+            _tokenizer = MistralTokenizer.v3(is_tekken=True).instruct_tokenizer.tokenizer
+        except ImportError:
+            pass  # mistral-common not installed, estimate instead
+    return _tokenizer
+
+
+def count_tokens(text):
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text or "", bos=False, eos=False))
+    return math.ceil(len(text or "") / 4)
+
+
+def _summary_key(conversation_id):
+    return "conversation:{}:summary".format(conversation_id)
+
+
+def _budget():
+    return getattr(settings, "HISTORY_TOKEN_BUDGET", 600)
+
+
+def build(conversation):
+    """
+    Return (history, summary) for the next roleplay prompt: the most recent turns that fit
+    the token budget, and a summary of what came before them (or None).
+    """
+    turns = conversation["turns"]
+    # `upto` numbers turns from the start of the conversation, counting any trimmed off the front
+    trimmed = conversation.get("trimmed", 0)
+    saved = cache.get(_summary_key(conversation["id"])) or {"text": "", "upto": 0}
+    covered = min(max(0, saved["upto"] - trimmed), len(turns))
+    summary_tokens = count_tokens(saved["text"])
+    budget = max(0, _budget() - summary_tokens)
+    costs = [count_tokens(text) + 4 for _, text, _ in turns]  # +4 for role/formatting overhead
+
+    # Walk back from the newest turn; the last exchange is always kept, even over budget
+    start, used = len(turns), 0
+    while start > covered:
+        cost = costs[start - 1]
+        if used + cost > budget and len(turns) - start >= 2:
+            break
+        used += cost
+        start -= 1
+
+    # Turns that fell out of the window stay verbatim until a summary covers them; they are
+    # folded in the background once there are enough of them to be worth an LLM call
+    pending = start - covered
+    if pending >= getattr(settings, "SUMMARY_BATCH_TURNS", 6):
+        _schedule_summary(conversation["id"], saved, turns[covered:start], trimmed + start)
+    used += sum(costs[covered:start])
+    start = covered
+
+    metrics.HISTORY_PROMPTS.inc()
+    metrics.HISTORY_TOKENS.inc(used + summary_tokens, kind="sent")
+    metrics.HISTORY_TOKENS.inc(sum(costs), kind="full")
+
+    history = [{"sender": sender, "text": text} for sender, text, _ in turns[start:]]
+    return history, saved["text"] or None
+
+
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+
+def _schedule_summary(conversation_id, saved, new_turns, upto):
+    with _in_progress_lock:
+        if conversation_id in _in_progress:
+            return
+        _in_progress.add(conversation_id)
+    utils.submit_background(_update_summary, conversation_id, saved["text"], new_turns, upto)
+
+
+def _update_summary(conversation_id, previous, new_turns, upto):
+    try:
+        text = utils.summarize_turns(previous, new_turns)
+        if text:
+            cache.set(_summary_key(conversation_id), {"text": text, "upto": upto},
+                      getattr(settings, "CONVERSATION_TTL", 6 * 60 * 60))
+            metrics.HISTORY_SUMMARIES.inc()
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard(conversation_id)
@@ -0,0 +1,79 @@
+"""
+Server-held chat conversations, so clients send only a conversation id and the new message.
+
+A conversation is a Conversation row (shared by every worker and kept across restarts) that
+expires CONVERSATION_TTL seconds after its last turn. Callers work with it as a plain dict;
+turns are compact [sender, text, mood] lists appended as the chat goes. context.build picks
+the prompt history from them, and EndPracticeView saves the whole transcript when practice
+ends. Past MAX_TURNS the oldest turns are dropped and counted in `trimmed`, so turns[i] is
+turn number trimmed + i of the conversation.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Conversation
+
+MAX_TURNS = 400  # hard cap on stored turns per conversation
+MAX_TEXT_LENGTH = 4096
+
+
+def _expired_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, "CONVERSATION_TTL", 6 * 60 * 60))
+
+
+def _turn(sender, text, mood=""):
+    return [sender, (text or "")[:MAX_TEXT_LENGTH], mood if sender == "assistant" else ""]
+
+
+def create(user, scenario):
+    """Start an empty conversation for `user`; turns are only ever added by the server."""
+    Conversation.objects.filter(updated_at__lt=_expired_before()).delete()
+    row = Conversation.objects.create(id=uuid.uuid4().hex, user=user, scenario=scenario)
+    return _as_dict(row)
+
+
+def load(conversation_id, user):
+    """Return the user's conversation, or None if the id is unknown, expired or someone else's."""
+    if not isinstance(conversation_id, str) or not conversation_id:
+        return None
+    row = Conversation.objects.filter(
+        id=conversation_id, user_id=user.pk, updated_at__gte=_expired_before(),
+    ).first()
+    return _as_dict(row) if row is not None else None
+
+
+def get_or_create(conversation_id, user, scenario):
+    conversation = load(conversation_id, user)
+    if conversation is None or conversation["scenario"] != scenario:
+        conversation = create(user, scenario)
+    return conversation
+
+
+def append(conversation, user_text, reply, mood):
+    """Record one completed exchange (child message and character reply)."""
+    turns = conversation["turns"]
+    turns.append(_turn("user", user_text))
+    turns.append(_turn("assistant", reply, mood))
+    excess = len(turns) - MAX_TURNS
+    if excess > 0:
+        del turns[:excess]
+        conversation["trimmed"] = conversation.get("trimmed", 0) + excess
+    Conversation.objects.filter(id=conversation["id"]).update(
+        turns=turns, trimmed=conversation["trimmed"], updated_at=timezone.now(),
+    )
+
+
+def transcript(conversation):
+    return [{"sender": sender, "text": text, "mood": mood} for sender, text, mood in conversation["turns"]]
+
+
+def discard(conversation):
+    Conversation.objects.filter(id=conversation["id"]).delete()
+
+
+def _as_dict(row):
+    return {"id": row.id, "user_id": row.user_id, "scenario": row.scenario,
+            "turns": row.turns, "trimmed": row.trimmed}
@@ -0,0 +1,107 @@
+"""
+UserDailyStats rollups: per-user, per-day, per-scenario counts of InteractionLog rows.
+
+log_interaction calls record() in the same transaction as the log insert, so the dashboard
+reads a few rows per day instead of every interaction. backfill() rebuilds rollups from the
+raw logs (`manage.py backfill_daily_stats`) and mismatches() compares the two
+(`manage.py check_daily_stats`).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import InteractionLog, UserDailyStats
+
+COUNTERS = ('total', 'flagged', 'happy', 'sad', 'angry', 'neutral')
+MOOD_COUNTERS = {'HAPPY': 'happy', 'SAD': 'sad', 'ANGRY': 'angry', 'NEUTRAL': 'neutral'}
+
+
+def counter_for(mood, flagged):
+    """Which column a log row counts towards besides `total`."""
+    if flagged:
+        return 'flagged'
+    return MOOD_COUNTERS.get(mood, 'neutral')
+
+
+def record(log):
+    """Add one InteractionLog row to its day's rollup (call inside the log's transaction)."""
+    record_many([log])
+
+
+def record_many(logs):
+    """Add a batch of InteractionLog rows to their rollups: one upsert per (user, day, scenario)."""
+    batches = {}
+    for log in logs:
+        key = (log.user_id, timezone.localdate(log.created_at), log.scenario)
+        counts = batches.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        counts['total'] += 1
+        counts[counter_for(log.mood, log.flagged)] += 1
+    for (user_id, date, scenario), counts in batches.items():
+        _increment(user_id, date, scenario, {c: n for c, n in counts.items() if n})
+
+
+def _increment(user_id, date, scenario, counts):
+    rows = UserDailyStats.objects.filter(user_id=user_id, date=date, scenario=scenario)
+    increments = {c: F(c) + n for c, n in counts.items()}
+    if rows.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            UserDailyStats.objects.create(user_id=user_id, date=date, scenario=scenario, **counts)
+    except IntegrityError:
+        # Another request created today's row first
+        rows.update(**increments)
+
+
+def aggregate(logs):
+    """Rollup rows computed from raw logs: dicts with user_id, date, scenario and every counter."""
+    unflagged = Q(flagged=False)
+    # Annotated as n_<counter> because `flagged` would shadow the model field in the filters
+    rows = (
+        logs.order_by()
+        .annotate(date=TruncDate('created_at'))
+        .values('user_id', 'date', 'scenario')
+        .annotate(
+            n_total=Count('id'),
+            n_flagged=Count('id', filter=Q(flagged=True)),
+            n_happy=Count('id', filter=unflagged & Q(mood='HAPPY')),
+            n_sad=Count('id', filter=unflagged & Q(mood='SAD')),
+            n_angry=Count('id', filter=unflagged & Q(mood='ANGRY')),
+            n_neutral=Count('id', filter=unflagged & ~Q(mood__in=['HAPPY', 'SAD', 'ANGRY'])),
+        )
+    )
+    for row in rows:
+        yield {
+            'user_id': row['user_id'], 'date': row['date'], 'scenario': row['scenario'],
+            **{c: row['n_' + c] for c in COUNTERS},
+        }
+
+
+def _scope(queryset, user_ids):
+    return queryset if user_ids is None else queryset.filter(user_id__in=user_ids)
+
+
+def backfill(user_ids=None, batch_size=1000):
+    """Rebuild rollups from InteractionLog for the given users (all users by default)."""
+    with transaction.atomic():
+        _scope(UserDailyStats.objects.all(), user_ids).delete()
+        rows = [UserDailyStats(**row) for row in aggregate(_scope(InteractionLog.objects.all(), user_ids))]
+        UserDailyStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def mismatches(user_ids=None):
+    """
+    Yield ((user_id, date, scenario), expected, actual) for every rollup that disagrees with
+    the raw logs; expected or actual is None when the row is missing on that side.
+    """
+    expected = {}
+    for row in aggregate(_scope(InteractionLog.objects.all(), user_ids)):
+        expected[(row['user_id'], row['date'], row['scenario'])] = {c: row[c] for c in COUNTERS}
+    actual = {}
+    for row in _scope(UserDailyStats.objects.all(), user_ids).values('user_id', 'date', 'scenario', *COUNTERS):
+        actual[(row['user_id'], row['date'], row['scenario'])] = {c: row[c] for c in COUNTERS}
+    for key in sorted(expected.keys() | actual.keys(), key=lambda k: (k[0], k[1], k[2])):
+        if expected.get(key) != actual.get(key):
+            yield key, expected.get(key), actual.get(key)
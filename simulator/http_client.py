@@ -0,0 +1,305 @@
+"""
+Shared outbound HTTP layer for the third-party APIs (ElevenLabs TTS and the Mistral LLM).
+
+- Keep-alive connection pools: HTTPClient for plain HTTP APIs, and an httpx-pooled Mistral client.
+- A concurrency limit per upstream, so a traffic spike waits for a free connection
+  instead of opening unbounded sockets.
+- A per-request deadline (REQUEST_BUDGET_SECONDS, started by RequestDeadlineMiddleware)
+  that caps the timeout of every outbound call made while handling that request.
+- Jittered exponential backoff on 429/5xx and connection errors, honoring Retry-After
+  and never sleeping past the deadline.
+"""
+import asyncio
+import contextvars
+import http.client
+import random
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class OutboundError(URLError):
+    """Base class for failures raised by this layer itself (rather than by the upstream)."""
+
+
+class DeadlineExceeded(OutboundError):
+    def __init__(self):
+        super().__init__("request deadline exceeded")
+
+
+class UpstreamBusy(OutboundError):
+    def __init__(self, host):
+        super().__init__("too many concurrent requests to {}".format(host))
+
+
+# ---- Request deadline ----
+
+_deadline = contextvars.ContextVar("outbound_deadline", default=None)
+
+
+def start_deadline(budget_seconds):
+    """Start a deadline `budget_seconds` from now for the current context. Returns a token for end_deadline."""
+    return _deadline.set(time.monotonic() + budget_seconds)
+
+
+def end_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when no deadline is set."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout(default):
+    """Timeout for one outbound call: `default`, capped by what is left of the request budget."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
+
+
+# ---- Retries ----
+
+def backoff_delay(attempt, base=None, cap=None, retry_after=None):
+    """Full-jitter exponential backoff; a server-provided Retry-After wins when present."""
+    if retry_after is not None:
+        return retry_after
+    base = _setting("OUTBOUND_RETRY_BASE_SECONDS", 0.25) if base is None else base
+    cap = _setting("OUTBOUND_RETRY_MAX_SECONDS", 4.0) if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_plan(attempt, error, is_retryable, retry_after_of, max_attempts):
+    """Return how long to sleep before the next attempt, or None to give up."""
+    if not is_retryable(error) or attempt + 1 >= max_attempts:
+        return None
+    delay = backoff_delay(attempt, retry_after=retry_after_of(error) if retry_after_of else None)
+    left = remaining()
+    if left is not None and delay >= left:
+        return None
+    return delay
+
+
+def with_retries(call, is_retryable, retry_after_of=None, max_attempts=None):
+    """Run `call()` and retry it with jittered backoff while `is_retryable(error)` holds."""
+    max_attempts = max_attempts or _setting("OUTBOUND_MAX_ATTEMPTS", 3)
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except Exception as e:
+            delay = _retry_plan(attempt, e, is_retryable, retry_after_of, max_attempts)
+            if delay is None:
+                raise
+            metrics.record_retry()
+            time.sleep(delay)
+            attempt += 1
+
+
+async def with_retries_async(call, is_retryable, retry_after_of=None, max_attempts=None):
+    """Coroutine version of with_retries; `call()` must return an awaitable."""
+    max_attempts = max_attempts or _setting("OUTBOUND_MAX_ATTEMPTS", 3)
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            delay = _retry_plan(attempt, e, is_retryable, retry_after_of, max_attempts)
+            if delay is None:
+                raise
+            metrics.record_retry()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+# ---- Plain HTTP client (ElevenLabs) ----
+
+class Response:
+    """An upstream response whose connection goes back to the pool once the body is consumed or closed."""
+
+    def __init__(self, client, conn, raw):
+        self._client = client
+        self._conn = conn
+        self._raw = raw
+        self.status = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+        self._released = False
+
+    def read(self):
+        try:
+            return self._raw.read()
+        except (http.client.HTTPException, OSError) as e:
+            raise URLError(e)
+        finally:
+            self.close()
+
+    def iter_chunks(self, chunk_size=8192):
+        try:
+            while True:
+                try:
+                    chunk = self._raw.read1(chunk_size)
+                except (http.client.HTTPException, OSError) as e:
+                    raise URLError(e)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._client._release(self._conn, self._raw)
+
+
+class HTTPClient:
+    """
+    Keep-alive connection pool to one host with at most `max_connections` requests in flight.
+    Requests beyond that wait (up to the call timeout) for a free slot, then fail with UpstreamBusy.
+    """
+
+    def __init__(self, base_url, max_connections=None, timeout=15, max_attempts=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.max_connections = max_connections or _setting("OUTBOUND_MAX_CONNECTIONS", 16)
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def _new_connection(self, timeout):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout):
+        if not self._slots.acquire(timeout=timeout):
+            raise UpstreamBusy(self.host)
+        with self._idle_lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn, raw):
+        """Keep the connection if its response was fully read and the server left it open."""
+        if raw is not None and raw.isclosed() and not raw.will_close:
+            with self._idle_lock:
+                self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def _send(self, method, path, body, headers, timeout):
+        """One attempt. A reused connection the server already closed is retried once on a fresh one."""
+        timeout = call_timeout(timeout or self.timeout)
+        conn, reused = self._acquire(timeout)
+        while True:
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                return Response(self, conn, conn.getresponse())
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if not reused:
+                    self._release(conn, None)
+                    raise URLError(e)
+                conn, reused = self._new_connection(timeout), False
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Send a request, retrying 429/5xx and connection errors with jittered backoff.
+        Returns a Response with status 2xx and the body unread; raises HTTPError for
+        other statuses and URLError for connection failures, deadline or saturation.
+        """
+        def attempt():
+            response = self._send(method, path, body, headers, timeout)
+            if 200 <= response.status < 300:
+                return response
+            response.read()
+            raise HTTPError(path, response.status, response.reason, response.headers, None)
+
+        def is_retryable(e):
+            if isinstance(e, HTTPError):
+                return e.code in RETRY_STATUSES
+            return isinstance(e, URLError) and not isinstance(e, OutboundError)
+
+        def retry_after_of(e):
+            return _parse_retry_after(e.headers.get("Retry-After")) if isinstance(e, HTTPError) else None
+
+        return with_retries(attempt, is_retryable, retry_after_of, self.max_attempts)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url):
+    """Shared HTTPClient per base URL."""
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = HTTPClient(base_url)
+        return _clients[base_url]
+
+
+# ---- Mistral ----
+
+def mistral_client(api_key):
+    """Mistral SDK client on shared, connection-limited httpx pools (sync and async)."""
+    from mistralai import Mistral
+
+    max_connections = _setting("OUTBOUND_MAX_CONNECTIONS", 16)
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    # `pool` bounds how long a call waits for a free connection when the limit is reached
+    timeout = httpx.Timeout(_setting("LLM_TIMEOUT_SECONDS", 20), pool=_setting("OUTBOUND_POOL_TIMEOUT_SECONDS", 5))
+    return Mistral(
+        api_key=api_key,
+        client=httpx.Client(limits=limits, timeout=timeout),
+        async_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+    )
+
+
+def llm_timeout_ms():
+    """Per-call timeout for the Mistral SDK, capped by the request deadline."""
+    return int(call_timeout(_setting("LLM_TIMEOUT_SECONDS", 20)) * 1000)
+
+
+def is_retryable_llm_error(e):
+    from mistralai.models import SDKError
+
+    if isinstance(e, SDKError):
+        return e.status_code in RETRY_STATUSES
+    return isinstance(e, httpx.TransportError) and not isinstance(e, httpx.PoolTimeout)
+
+
+def llm_retry_after(e):
+    response = getattr(e, "raw_response", None)
+    return _parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
@@ -0,0 +1,217 @@
+"""
+LLM providers behind one small interface, so the chat pipeline (utils.py) does not care
+whether it talks to Mistral or to a local stand-in.
+
+A provider takes chat messages ([{"role", "content"}, ...]) and offers:
+    complete(messages) -> str
+    await complete_async(messages) -> str
+    stream(messages) -> iterator of text deltas
+
+LLM_PROVIDER picks one at startup:
+    mistral  (default) the Mistral API; needs MISTRAL_API_KEY
+    stub     StubProvider: canned, deterministic answers with configurable latency,
+             error rate and rate limit (LLM_STUB_LATENCY_MS, LLM_STUB_JITTER_MS,
+             LLM_STUB_ERROR_RATE, LLM_STUB_SEED, LLM_STUB_REQUESTS_PER_MINUTE), for load
+             tests and local development without an API key
+"""
+import asyncio
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from . import http_client, metrics
+
+MISTRAL_MODEL = "mistral-small-latest"
+
+
+class LLMProvider:
+    name = "base"
+
+    def complete(self, messages):
+        raise NotImplementedError
+
+    async def complete_async(self, messages):
+        raise NotImplementedError
+
+    def stream(self, messages):
+        raise NotImplementedError
+
+
+class MistralProvider(LLMProvider):
+    """Mistral chat completions with per-call deadlines and jittered retries (see http_client)."""
+    name = "mistral"
+
+    def __init__(self, api_key=None, model=MISTRAL_MODEL, client=None):
+        self.model = model
+        # Pooled, connection-limited client unless one is passed in (tests, benchmarks)
+        self.client = client if client is not None else http_client.mistral_client(api_key)
+
+    def complete(self, messages):
+        response = http_client.with_retries(
+            lambda: self.client.chat.complete(
+                model=self.model, messages=messages, timeout_ms=http_client.llm_timeout_ms()),
+            http_client.is_retryable_llm_error,
+            http_client.llm_retry_after,
+        )
+        metrics.record_usage(getattr(response, "usage", None))
+        return (response.choices[0].message.content or "").strip()
+
+    async def complete_async(self, messages):
+        response = await http_client.with_retries_async(
+            lambda: self.client.chat.complete_async(
+                model=self.model, messages=messages, timeout_ms=http_client.llm_timeout_ms()),
+            http_client.is_retryable_llm_error,
+            http_client.llm_retry_after,
+        )
+        metrics.record_usage(getattr(response, "usage", None))
+        return (response.choices[0].message.content or "").strip()
+
+    def stream(self, messages):
+        stream = http_client.with_retries(
+            lambda: self.client.chat.stream(
+                model=self.model, messages=messages, timeout_ms=http_client.llm_timeout_ms()),
+            http_client.is_retryable_llm_error,
+            http_client.llm_retry_after,
+        )
+        with stream:
+            for event in stream:
+                # Usage arrives on the final chunk
+                metrics.record_usage(getattr(event.data, "usage", None))
+                choices = event.data.choices
+                delta = choices[0].delta.content if choices else None
+                if isinstance(delta, str) and delta:
+                    yield delta
+
+
+class StubLLMError(Exception):
+    """A simulated provider failure (StubProvider error_rate)."""
+
+
+class StubRateLimited(StubLLMError):
+    """A simulated 429: more than `rate_limit` calls in the last `rate_window` seconds."""
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("simulated rate limit exceeded")
+        self.retry_after = retry_after
+
+
+STUB_FLAG_WORDS = ("stupid", "dumb", "hate you", "shut up", "ugly", "idiot", "loser")
+STUB_REPLIES = (
+    "Oh, thank you for asking so nicely! Let me help you with that. [HAPPY]",
+    "Hmm, let me think about that for a moment. [NEUTRAL]",
+    "That sounds a little sad. Do you want to tell me more? [SAD]",
+    "Sure! It's right over there, next to the big sign. [HAPPY]",
+    "Okay. What would you like to do next? [NEUTRAL]",
+)
+STUB_SUGGESTIONS = "Yes please\nThank you\nWhere is it?\nCan you show me?"
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic local stand-in: FLAG/PASS verdicts from a small word list, mood-tagged
+    replies picked by hashing the child's message, four suggestions, and a one-line summary.
+    Token usage is estimated at ~4 characters per token. Each call sleeps `latency_ms`
+    (+ up to `jitter_ms`) and fails with StubLLMError with probability `error_rate`; jitter
+    and failures come from a seeded RNG. With `rate_limit`, calls beyond that many in the
+    last `rate_window` seconds are rejected at once with StubRateLimited, like a provider 429.
+    """
+    name = "stub"
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=0, rate_limit=0, rate_window=60.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._accepted = deque()  # monotonic times of the calls inside the rate window
+        self.calls = 0
+        self.rejected = 0
+
+    def _admit(self):
+        now = time.monotonic()
+        while self._accepted and self._accepted[0] <= now - self.rate_window:
+            self._accepted.popleft()
+        if len(self._accepted) >= self.rate_limit:
+            self.rejected += 1
+            raise StubRateLimited(self._accepted[0] + self.rate_window - now)
+        self._accepted.append(now)
+
+    def _draw(self):
+        """(delay in seconds, whether this call fails) for the next call; raises StubRateLimited."""
+        with self._rng_lock:
+            if self.rate_limit:
+                self._admit()
+            self.calls += 1
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+        return delay, fail
+
+    @staticmethod
+    def respond(messages):
+        system = messages[0]["content"] if messages else ""
+        last = messages[-1]["content"] if messages else ""
+        if system.startswith("You are a filter"):
+            return "FLAG" if any(w in last.lower() for w in STUB_FLAG_WORDS) else "PASS"
+        if system.startswith("Reply with only 4"):
+            return STUB_SUGGESTIONS
+        if system.startswith("You keep a short memory"):
+            return "The child has been practicing polite questions."
+        index = int(hashlib.sha1(last.encode("utf-8")).hexdigest(), 16) % len(STUB_REPLIES)
+        return STUB_REPLIES[index]
+
+    @staticmethod
+    def _reply(messages):
+        text = StubProvider.respond(messages)
+        prompt = sum(len(m["content"]) for m in messages)
+        metrics.record_tokens(math.ceil(prompt / 4), math.ceil(len(text) / 4))
+        return text
+
+    def complete(self, messages):
+        delay, fail = self._draw()
+        time.sleep(delay)
+        if fail:
+            raise StubLLMError("simulated provider error")
+        return self._reply(messages)
+
+    async def complete_async(self, messages):
+        delay, fail = self._draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise StubLLMError("simulated provider error")
+        return self._reply(messages)
+
+    def stream(self, messages):
+        delay, fail = self._draw()
+        if fail:
+            time.sleep(delay)
+            raise StubLLMError("simulated provider error")
+        words = self._reply(messages).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(delay / len(words))
+            yield word if i == 0 else " " + word
+
+
+def from_env():
+    """The provider configured by LLM_PROVIDER, or None if Mistral is selected without an API key."""
+    name = os.getenv("LLM_PROVIDER", "mistral")
+    if name == "stub":
+        return StubProvider(
+            latency_ms=float(os.getenv("LLM_STUB_LATENCY_MS", "300")),
+            jitter_ms=float(os.getenv("LLM_STUB_JITTER_MS", "200")),
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+            seed=int(os.getenv("LLM_STUB_SEED", "0")),
+            rate_limit=int(os.getenv("LLM_STUB_REQUESTS_PER_MINUTE", "0")),
+        )
+    if name != "mistral":
+        raise ValueError("Unknown LLM_PROVIDER {!r}; use 'mistral' or 'stub'".format(name))
+    api_key = os.getenv("MISTRAL_API_KEY", "YOUR_MISTRAL_API_KEY")
+    if api_key == "YOUR_MISTRAL_API_KEY":
+        return None
+    return MistralProvider(api_key)
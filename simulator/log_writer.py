@@ -0,0 +1,154 @@
+"""
+Buffered InteractionLog writer, so chat responses do not wait on an analytics INSERT.
+
+log_interaction hands rows to a bounded in-process queue; a background thread drains it and
+writes them with one bulk_create (plus their UserDailyStats rollups) in a single transaction
+every LOG_WRITER_BATCH_SIZE rows or LOG_WRITER_FLUSH_MS milliseconds, whichever comes first.
+The thread is started on first use and stop() - registered with atexit - drains the queue
+before the process exits, so a graceful shutdown loses nothing.
+
+When the queue is full (LOG_WRITER_MAX_QUEUE rows) LOG_WRITER_OVERFLOW decides:
+  "sync"  write the row on the calling thread, as without the buffer (default, never drops)
+  "drop"  discard it and count it in stats()["dropped"]
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import daily_stats, metrics
+from .models import InteractionLog
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LogWriter:
+
+    def __init__(self, batch_size=100, flush_ms=200, max_queue=10000, overflow="sync"):
+        if overflow not in ("sync", "drop"):
+            raise ValueError("overflow must be 'sync' or 'drop'")
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.overflow = overflow
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._state_lock = threading.Lock()  # orders submits against stop()
+        self._stopped = False
+        self._tally = metrics.Tally(
+            metrics.LOG_WRITER_EVENTS, "event", ("queued", "written", "written_sync", "dropped", "failed", "flushes"))
+
+    def stats(self):
+        snapshot = self._tally.snapshot()
+        snapshot["pending"] = self._queue.qsize()
+        return snapshot
+
+    def submit(self, user_id, scenario, mood, flagged):
+        """Queue one log row; returns immediately unless the queue is full and overflow is "sync"."""
+        # Stamped now, not at flush time, so a row cannot slip into the next day's rollup
+        log = InteractionLog(user_id=user_id, scenario=scenario, mood=mood, flagged=flagged,
+                             created_at=timezone.now())
+        with self._state_lock:
+            if not self._stopped:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="interaction-log-writer", daemon=True)
+                    self._thread.start()
+                try:
+                    self._queue.put_nowait(log)
+                except queue.Full:
+                    pass
+                else:
+                    self._tally.inc("queued")
+                    return
+                if self.overflow == "drop":
+                    self._tally.inc("dropped")
+                    return
+        # Queue full (overflow "sync") or writer stopped: write on the calling thread
+        self._write([log])
+        self._tally.inc("written_sync")
+
+    def stop(self, timeout=10):
+        """Flush everything queued so far and stop the thread; later submits are written synchronously."""
+        with self._state_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            # No submit can queue after this point, so the sentinel is last
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    self._flush(batch)
+                    return
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._flush(batch)
+                    batch, deadline = [], None
+        finally:
+            connection.close()
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        close_old_connections()
+        try:
+            self._write(batch)
+        except Exception:
+            # Retry row by row so one bad row (e.g. a user deleted meanwhile) does not sink the batch
+            logger.exception("Could not write %d interaction logs as a batch", len(batch))
+            for log in batch:
+                try:
+                    self._write([log])
+                except Exception:
+                    self._tally.inc("failed")
+                else:
+                    self._tally.inc("written")
+        else:
+            self._tally.inc("written", len(batch))
+        self._tally.inc("flushes")
+
+    @staticmethod
+    def _write(logs):
+        with metrics.stage("log_flush"), transaction.atomic():
+            InteractionLog.objects.bulk_create(logs)
+            daily_stats.record_many(logs)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide writer, configured from settings and flushed at exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter(
+                batch_size=getattr(settings, "LOG_WRITER_BATCH_SIZE", 100),
+                flush_ms=getattr(settings, "LOG_WRITER_FLUSH_MS", 200),
+                max_queue=getattr(settings, "LOG_WRITER_MAX_QUEUE", 10000),
+                overflow=getattr(settings, "LOG_WRITER_OVERFLOW", "sync"),
+            )
+            atexit.register(_writer.stop)
+        return _writer
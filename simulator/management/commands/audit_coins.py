@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import coins, profile_cache
+from simulator.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Check every coin balance against the CoinTransaction ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only this user id (repeatable); default is every user")
+        parser.add_argument("--fix", action="store_true", help="Reset mismatched balances to the ledger total")
+
+    def handle(self, *args, **options):
+        bad = list(coins.mismatches(options["user_ids"]))
+        for user_id, balance, total in bad:
+            self.stdout.write("user={} balance={} ledger={}".format(user_id, balance, total))
+        if not bad:
+            self.stdout.write(self.style.SUCCESS("All balances match the ledger"))
+            return
+        if options["fix"]:
+            for user_id, _, total in bad:
+                UserProfile.objects.filter(user_id=user_id).update(coins=max(total, 0))
+                profile_cache.invalidate(user_id)
+            self.stdout.write(self.style.SUCCESS("Rebuilt {} balance(s) from the ledger".format(len(bad))))
+            return
+        raise CommandError("{} balance(s) differ from the ledger; rerun with --fix".format(len(bad)))
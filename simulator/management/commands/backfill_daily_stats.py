@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from simulator import daily_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild UserDailyStats rollups from the raw InteractionLog rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only this user id (repeatable); default is every user")
+
+    def handle(self, *args, **options):
+        count = daily_stats.backfill(options["user_ids"])
+        self.stdout.write(self.style.SUCCESS("Wrote {} daily rollup rows".format(count)))
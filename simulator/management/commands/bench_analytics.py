@@ -0,0 +1,87 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from simulator import daily_stats
+from simulator.models import InteractionLog
+
+SCENARIOS = ["Grocery Store", "Playground", "Classroom", "Birthday Party", "Doctor's Office"]
+MOODS = ["HAPPY", "SAD", "ANGRY", "NEUTRAL"]
+BENCH_USERNAME = "bench_analytics"
+
+
+def seed_logs(user, rows, days=90, batch_size=10000):
+    """
+    Insert `rows` InteractionLog rows for `user`, spread over the last `days` days.
+    created_at only defaults to now, so each row gets its own timestamp; rows go through
+    executemany rather than bulk_create to skip building a million model instances. The
+    UserDailyStats rollups are not updated (run daily_stats.backfill afterwards).
+    """
+    rng = random.Random(rows)
+    now = timezone.now()
+    table = connection.ops.quote_name(InteractionLog._meta.db_table)
+    sql = "INSERT INTO {} (user_id, scenario, mood, flagged, created_at) VALUES (%s, %s, %s, %s, %s)".format(table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, rows, batch_size):
+            batch = []
+            for _ in range(min(batch_size, rows - offset)):
+                flagged = rng.random() < 0.05
+                created = now - timedelta(seconds=rng.randrange(days * 24 * 60 * 60))
+                batch.append((user.pk, rng.choice(SCENARIOS), "" if flagged else rng.choice(MOODS), flagged, created))
+            cursor.executemany(sql, batch)
+
+
+class Command(BaseCommand):
+    help = "Seed InteractionLog rows for a benchmark user and time /api/analytics/ against them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000000, help="Log rows to seed for the benchmark user")
+        parser.add_argument("--runs", type=int, default=5, help="Timed requests (the best and worst are reported)")
+        parser.add_argument("--max-queries", type=int, default=2, help="Fail if one request runs more queries")
+        parser.add_argument("--max-ms", type=float, default=200.0, help="Fail if the slowest request takes longer")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded user and rows afterwards")
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create_user(username=BENCH_USERNAME)
+        try:
+            start = time.perf_counter()
+            seed_logs(user, options["rows"])
+            self.stdout.write("Seeded {} rows in {:.1f}s".format(options["rows"], time.perf_counter() - start))
+            start = time.perf_counter()
+            rollups = daily_stats.backfill([user.pk])
+            self.stdout.write("Backfilled {} rollup rows in {:.1f}s".format(rollups, time.perf_counter() - start))
+
+            client = APIClient()
+            client.force_authenticate(user)
+            timings, queries = [], 0
+            for _ in range(options["runs"]):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.get("/api/analytics/", HTTP_HOST="localhost")
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError("/api/analytics/ returned {}".format(response.status_code))
+                queries = max(queries, len(captured.captured_queries))
+        finally:
+            if not options["keep"]:
+                InteractionLog.objects.filter(user=user).delete()
+                user.delete()
+
+        total = response.json()["total_interactions"]
+        self.stdout.write("total_interactions={} queries={} best={:.1f}ms worst={:.1f}ms".format(
+            total, queries, min(timings), max(timings)))
+        if total != options["rows"]:
+            raise CommandError("Expected {} interactions, got {}".format(options["rows"], total))
+        if queries > options["max_queries"]:
+            raise CommandError("{} queries per request (max {})".format(queries, options["max_queries"]))
+        if max(timings) > options["max_ms"]:
+            raise CommandError("Slowest request took {:.1f}ms (max {:.0f}ms)".format(max(timings), options["max_ms"]))
+        self.stdout.write(self.style.SUCCESS("OK"))
@@ -0,0 +1,326 @@
+import json
+import platform
+import random
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from simulator import daily_stats, llm, transcripts, tts, urls, utils
+from simulator.models import CoinTransaction, PracticeSession, PracticeSessionMessage, UserProfile
+from .bench_analytics import SCENARIOS, seed_logs
+from .bench_end_practice import transcript
+
+USERNAME_PREFIX = "bench_api_"
+PASSWORD = "bench-pass-123"
+SCALES = {"10k": 10000, "100k": 100000, "1M": 1000000}
+# Compared against the baseline: relative threshold for time and memory, any increase for queries.
+# Latency is gated on the median; p95 of a few dozen runs is one or two samples, too noisy to fail on
+COMPARED = ("p50_ms", "queries", "peak_kib")
+
+
+def parse_scale(value):
+    """'10k', '100k', '1M' or a plain number of interaction logs."""
+    if value in SCALES:
+        return SCALES[value]
+    match = re.fullmatch(r"(\d+)([kKmM]?)", value)
+    if not match:
+        raise CommandError("Unknown scale {!r}; use 10k, 100k, 1M or a number".format(value))
+    return int(match.group(1)) * {"": 1, "k": 1000, "m": 1000000}[match.group(2).lower()]
+
+
+def seed_dataset(logs):
+    """
+    Synthetic data sized by `logs` interaction logs: logs / 1000 users (at least 5), one session
+    with a 6-40 line transcript per 20 logs, a coin profile with its opening ledger row per user,
+    and the daily rollups. The first user, who the benchmark requests run as, owns a tenth of the
+    logs and of the sessions. Returns that user.
+    """
+    rng = random.Random(logs)
+    n_users = max(5, logs // 1000)
+    users = User.objects.bulk_create([
+        User(username="{}{}".format(USERNAME_PREFIX, i), password="!") for i in range(n_users)
+    ])
+    if users[0].pk is None:  # backends that do not return ids from bulk inserts
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by("id"))
+    primary = users[0]
+    primary.set_password(PASSWORD)
+    primary.save(update_fields=["password"])
+
+    shares = [logs // 10] + [(logs - logs // 10) // (n_users - 1)] * (n_users - 1)
+    for user, rows in zip(users, shares):
+        seed_logs(user, rows)
+
+    sessions = max(20, logs // 20)
+    owners = [primary] * (sessions // 10) + [rng.choice(users[1:]) for _ in range(sessions - sessions // 10)]
+    compact = getattr(settings, "COMPACT_TRANSCRIPTS", True)
+    for offset in range(0, sessions, 2000):
+        batch, lines = [], []
+        for owner in owners[offset:offset + 2000]:
+            cleaned = transcripts.clean(transcript(rng.randint(6, 40)))
+            lines.append(cleaned)
+            batch.append(PracticeSession(
+                user=owner, scenario=rng.choice(SCENARIOS), total_messages=len(cleaned),
+                kind_moments=rng.randint(0, 5), flagged_count=rng.randint(0, 2),
+                transcript_blob=transcripts.encode([m for _, m in cleaned]) if compact else None,
+            ))
+        batch = PracticeSession.objects.bulk_create(batch)
+        if not compact:
+            PracticeSessionMessage.objects.bulk_create([
+                PracticeSessionMessage(session=session, order=i, **m)
+                for session, cleaned in zip(batch, lines) for i, m in cleaned
+            ], batch_size=5000)
+
+    UserProfile.objects.bulk_create([UserProfile(user=user, coins=200) for user in users])
+    CoinTransaction.objects.bulk_create([
+        CoinTransaction(user=user, kind="opening", amount=200, balance_after=200) for user in users
+    ])
+    daily_stats.backfill([user.pk for user in users])
+    return primary
+
+
+def remove_dataset():
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+
+@contextmanager
+def scratch_database():
+    """
+    Point the default connection at a freshly migrated test database (the one `manage.py test`
+    uses) for the duration of the block, then drop it, so the configured database is not touched.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _new_buyer(ctx):
+    """A fresh user with 200 coins for each timed /shop/redeem/ run, so every run is a successful purchase."""
+    ctx["buyers"] += 1
+    buyer = User.objects.create(username="{}buyer_{}".format(USERNAME_PREFIX, ctx["buyers"]), password="!")
+    UserProfile.objects.create(user=buyer, coins=200)
+    CoinTransaction.objects.create(user=buyer, kind="opening", amount=200, balance_after=200)
+    ctx["buyer"].credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=buyer).key)
+
+
+def _stream(client, path, data):
+    response = client.post(path, data, format="json")
+    b"".join(response.streaming_content)
+    return response
+
+
+def _p95(timings):
+    return statistics.quantiles(timings, n=20, method="inclusive")[-1] if len(timings) > 1 else timings[0]
+
+
+# url name -> (method, path, request(ctx, i) -> response, optional setup(ctx) run before each request)
+ROUTES = {
+    "chat_interaction": ("POST", "/api/chat/", lambda ctx, i: ctx["client"].post(
+        "/api/chat/", {"message": "Where are the apples? ({})".format(i), "scenario": "Grocery Store"},
+        format="json"), None),
+    "chat_stream": ("POST", "/api/chat/stream/", lambda ctx, i: _stream(
+        ctx["client"], "/api/chat/stream/", {"message": "Can I play too? ({})".format(i), "scenario": "Playground"}),
+        None),
+    "chat_interaction_async": ("POST", "/api/chat/async/", lambda ctx, i: ctx["client"].post(
+        "/api/chat/async/", {"message": "Is this seat free? ({})".format(i), "scenario": "Classroom"},
+        format="json"), None),
+    "signup": ("POST", "/api/signup/", lambda ctx, i: ctx["anonymous"].post(
+        "/api/signup/", {"username": "{}signup_{}".format(USERNAME_PREFIX, i), "password": PASSWORD},
+        format="json"), None),
+    "login": ("POST", "/api/login/", lambda ctx, i: ctx["anonymous"].post(
+        "/api/login/", {"username": ctx["user"].username, "password": PASSWORD}, format="json"), None),
+    "analytics": ("GET", "/api/analytics/", lambda ctx, i: ctx["client"].get("/api/analytics/"), None),
+    "profile": ("GET", "/api/profile/", lambda ctx, i: ctx["client"].get("/api/profile/"), None),
+    "coins_award": ("POST", "/api/coins/award/", lambda ctx, i: ctx["client"].post(
+        "/api/coins/award/", {"amount": 5}, format="json"), None),
+    "shop": ("GET", "/api/shop/", lambda ctx, i: ctx["client"].get("/api/shop/"), None),
+    "shop_redeem": ("POST", "/api/shop/redeem/", lambda ctx, i: ctx["buyer"].post(
+        "/api/shop/redeem/", {"reward_id": "kindness_badge"}, format="json"), _new_buyer),
+    "practice_end": ("POST", "/api/practice/end/", lambda ctx, i: ctx["client"].post(
+        "/api/practice/end/", {"scenario": "Grocery Store", "messages": transcript(40), "total_messages": 40},
+        format="json"), None),
+    "session_list": ("GET", "/api/sessions/", lambda ctx, i: ctx["client"].get("/api/sessions/"), None),
+    "session_detail": ("GET", "/api/sessions/<id>/", lambda ctx, i: ctx["client"].get(
+        "/api/sessions/{}/".format(ctx["session_id"])), None),
+    "tts": ("GET", "/api/tts/", lambda ctx, i: ctx["anonymous"].get(
+        "/api/tts/", {"text": "Hi there! What can I help you find today?"}), None),
+}
+
+
+def compare(result, baseline, threshold, min_delta_ms, min_delta_kib):
+    """Return a description of every metric in `result` that regressed against `baseline`."""
+    if result["logs"] != baseline["logs"]:
+        raise CommandError("Baseline was recorded at {} logs, this run used {}".format(baseline["logs"], result["logs"]))
+    regressions = []
+    for name, old in sorted(baseline["routes"].items()):
+        new = result["routes"].get(name)
+        if new is None:
+            regressions.append("{}: missing from this run".format(name))
+            continue
+        for metric in COMPARED:
+            before, after = old[metric], new[metric]
+            if metric == "queries":
+                worse = after > before
+            else:
+                floor = min_delta_ms if metric.endswith("_ms") else min_delta_kib
+                worse = after > before * (1 + threshold) and after - before > floor
+            if worse:
+                regressions.append("{}: {} {} -> {}".format(name, metric, before, after))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every /api/ route on synthetic data in a scratch test database with a stub LLM: latency, "
+        "query count and peak memory, written as JSON and optionally compared against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", default="10k", help="Interaction logs to seed: 10k, 100k, 1M or a number")
+        parser.add_argument("--runs", type=int, default=20, help="Timed requests per route")
+        parser.add_argument("--routes", help="Comma-separated url names (default: every route in simulator/urls.py)")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--compare", metavar="BASELINE", help="Fail if a metric regressed against this JSON file")
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Allowed relative increase in latency and memory (queries may not increase at all)")
+        parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore latency increases smaller than this")
+        parser.add_argument("--min-delta-kib", type=float, default=64.0, help="Ignore memory increases smaller than this")
+        parser.add_argument("--in-place", action="store_true",
+                            help="Use the configured database (already a test database) instead of a scratch one")
+
+    def handle(self, *args, **options):
+        logs = parse_scale(options["scale"])
+        names = [p.name for p in urls.urlpatterns]
+        missing = [name for name in names if name not in ROUTES]
+        if missing:
+            raise CommandError("No benchmark case for route(s): {}".format(", ".join(missing)))
+        if options["routes"]:
+            names = [name.strip() for name in options["routes"].split(",") if name.strip()]
+            unknown = [name for name in names if name not in ROUTES]
+            if unknown:
+                raise CommandError("Unknown route(s): {}".format(", ".join(unknown)))
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            if baseline["logs"] != logs:
+                raise CommandError("Baseline was recorded at {} logs; rerun with --scale {}".format(
+                    baseline["logs"], baseline["logs"]))
+
+        with ExitStack() as stack:
+            if options["in_place"]:
+                remove_dataset()
+                stack.callback(remove_dataset)
+            else:
+                stack.enter_context(scratch_database())
+            # Analytics rows are written on the request thread, so their cost shows up in the numbers
+            stack.enter_context(override_settings(
+                INTERACTION_LOG_BUFFERED=False,
+                TTS_CACHE_DIR=stack.enter_context(tempfile.TemporaryDirectory()),
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "localhost"],
+            ))
+            stack.enter_context(mock.patch.object(utils, "provider", llm.StubProvider()))
+            stack.enter_context(mock.patch.dict("os.environ", {"ELEVENLABS_API_KEY": "bench"}))
+            stack.enter_context(mock.patch.object(tts, "_cache", None))
+
+            start = time.perf_counter()
+            user = seed_dataset(logs)
+            self.stdout.write("Seeded {} logs in {:.1f}s".format(logs, time.perf_counter() - start))
+            result = self._run(user, logs, names, options["runs"])
+
+        self._report(result)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2, sort_keys=True)
+                f.write("\n")
+            self.stdout.write("Wrote {}".format(options["output"]))
+        if baseline is not None:
+            if options["routes"]:
+                baseline["routes"] = {k: v for k, v in baseline["routes"].items() if k in names}
+            regressions = compare(result, baseline, options["threshold"], options["min_delta_ms"], options["min_delta_kib"])
+            if regressions:
+                raise CommandError("Regressed against {}:\n  {}".format(options["compare"], "\n  ".join(regressions)))
+            self.stdout.write(self.style.SUCCESS("No regressions against {}".format(options["compare"])))
+
+    def _run(self, user, logs, names, runs):
+        client = APIClient(HTTP_HOST="localhost")
+        client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=user).key)
+        tts.get_cache().put(tts.cache_key("Hi there! What can I help you find today?", tts.get_voice_id()), b"ID3" * 1000)
+        ctx = {
+            "user": user,
+            "client": client,
+            "anonymous": APIClient(HTTP_HOST="localhost"),
+            "buyer": APIClient(HTTP_HOST="localhost"),
+            "buyers": 0,
+            "session_id": PracticeSession.objects.filter(user=user).values_list("id", flat=True).first(),
+        }
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+
+        routes = {}
+        for name in names:
+            method, path, request, setup = ROUTES[name]
+            timings = []
+            for i in range(runs + 2):
+                if setup:
+                    setup(ctx)
+                if i == 0:  # warm-up: caches, lazily loaded modules
+                    request(ctx, i)
+                    continue
+                if i == runs + 1:  # one extra request for queries and memory, which slow it down
+                    with CaptureQueriesContext(connection) as captured:
+                        tracemalloc.start()
+                        response = request(ctx, i)
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    break
+                started = time.perf_counter()
+                response = request(ctx, i)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError("{} {} returned {}: {}".format(method, path, response.status_code, response.content[:200]))
+            timings.sort()
+            routes[name] = {
+                "method": method,
+                "path": path,
+                "status": response.status_code,
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(_p95(timings), 2),
+                "max_ms": round(timings[-1], 2),
+                "queries": len(captured.captured_queries),
+                "peak_kib": round(peak / 1024, 1),
+            }
+        return {
+            "logs": logs,
+            "users": users,
+            "runs": runs,
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "compact_transcripts": getattr(settings, "COMPACT_TRANSCRIPTS", True),
+            },
+            "routes": routes,
+        }
+
+    def _report(self, result):
+        self.stdout.write("{:24s} {:>9s} {:>9s} {:>9s} {:>8s} {:>10s}".format(
+            "route", "p50 ms", "p95 ms", "max ms", "queries", "peak KiB"))
+        for name, row in result["routes"].items():
+            self.stdout.write("{:24s} {:9.2f} {:9.2f} {:9.2f} {:8d} {:10.1f}".format(
+                name, row["p50_ms"], row["p95_ms"], row["max_ms"], row["queries"], row["peak_kib"]))
@@ -0,0 +1,62 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from simulator import caching, llm, utils
+from simulator.authentication import CachedTokenAuthentication
+from simulator.views import ChatInteractionView
+
+BENCH_USERNAME = "bench_auth_queries"
+
+
+class Command(BaseCommand):
+    help = "Compare DB queries and latency per /api/chat/ request with plain vs cached token authentication."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Chat requests per mode")
+
+    def handle(self, *args, **options):
+        if not caching.is_shared():
+            self.stderr.write(self.style.WARNING(
+                "The default cache is per-process, so cached token lookups are off and both modes "
+                "query the database; configure a shared CACHES backend to measure them."))
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create_user(username=BENCH_USERNAME)
+        headers = {"Authorization": "Token " + Token.objects.create(user=user).key}
+        saved = utils.provider
+        utils.provider = llm.StubProvider()
+        try:
+            results = {}
+            for name, backend in (("token", TokenAuthentication), ("cached", CachedTokenAuthentication)):
+                cache.clear()
+                with mock.patch.object(ChatInteractionView, "authentication_classes", [backend]):
+                    results[name] = self._run(headers, options["requests"], name)
+        finally:
+            utils.provider = saved
+            user.delete()
+
+        for name, (queries, elapsed) in results.items():
+            self.stdout.write("{:6s}  queries/request={:.2f}  avg={:.2f}ms".format(
+                name, queries / options["requests"], elapsed * 1000 / options["requests"]))
+        saved_queries = (results["token"][0] - results["cached"][0]) / options["requests"]
+        self.stdout.write(self.style.SUCCESS("Saved {:.2f} queries per chat request".format(saved_queries)))
+
+    def _run(self, headers, requests, name):
+        client = Client(HTTP_HOST="localhost")
+        queries, elapsed = 0, 0.0
+        for i in range(requests):
+            body = {"message": "hello there {} {}".format(name, i), "scenario": "Grocery Store"}
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                client.post("/api/chat/", body, content_type="application/json", headers=headers)
+                elapsed += time.perf_counter() - start
+            queries += len(captured.captured_queries)
+        return queries, elapsed
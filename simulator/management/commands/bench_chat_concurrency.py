@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from simulator import llm, utils
+
+
+class _SlowChat:
+    """Stand-in for client.chat: every completion takes `latency` seconds and tracks peak in-flight calls."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _response(messages):
+        system = messages[0]["content"]
+        if system.startswith("You are a filter"):
+            content = "PASS"
+        elif system.startswith("Reply with only 4"):
+            content = "Yes please\nThank you\nWhere is it?\nOkay"
+        else:
+            content = "Sure, I can help with that! [HAPPY]"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def complete(self, model, messages, **kwargs):
+        self._enter()
+        try:
+            time.sleep(self.latency)
+            return self._response(messages)
+        finally:
+            self._exit()
+
+    async def complete_async(self, model, messages, **kwargs):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+            return self._response(messages)
+        finally:
+            self._exit()
+
+
+def _message(mode, i):
+    # Distinct texts so every turn pays for a vibe check (no verdict cache hits)
+    return "thank you for helping me {} {}".format(mode, i)
+
+
+class Command(BaseCommand):
+    help = "Compare how many concurrent chats the sync and async chat pipelines sustain against a slow stub LLM."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chats", type=int, default=500, help="Number of simulated chat turns per mode")
+        parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM latency per call (seconds)")
+        parser.add_argument("--workers", type=int, default=8, help="Sync mode: worker threads (like WSGI threads)")
+        parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+
+    def handle(self, *args, **options):
+        chats, latency, workers = options["chats"], options["latency"], options["workers"]
+        saved = utils.provider
+        try:
+            if options["mode"] in ("sync", "both"):
+                self._report("sync", *self._run_sync(chats, latency, workers))
+            if options["mode"] in ("async", "both"):
+                self._report("async", *self._run_async(chats, latency))
+        finally:
+            utils.provider = saved
+
+    def _install(self, latency):
+        chat = _SlowChat(latency)
+        utils.provider = llm.MistralProvider(client=SimpleNamespace(chat=chat))
+        return chat
+
+    def _run_sync(self, chats, latency, workers):
+        chat = self._install(latency)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda i: utils.analyze_interaction(_message("sync", i), "Grocery Store"), range(chats)))
+        return results, time.perf_counter() - start, chat.peak
+
+    def _run_async(self, chats, latency):
+        chat = self._install(latency)
+
+        async def run_all():
+            return await asyncio.gather(*(
+                utils.analyze_interaction_async(_message("async", i), "Grocery Store") for i in range(chats)
+            ))
+
+        start = time.perf_counter()
+        results = asyncio.run(run_all())
+        return results, time.perf_counter() - start, chat.peak
+
+    def _report(self, mode, results, elapsed, peak_llm_calls):
+        ok = sum(1 for r in results if r.get("status") == "success")
+        self.stdout.write(
+            f"{mode:5s}  chats={len(results)} ok={ok} elapsed={elapsed:.2f}s "
+            f"throughput={len(results) / elapsed:.1f} chats/s peak_in_flight_llm_calls={peak_llm_calls}"
+        )
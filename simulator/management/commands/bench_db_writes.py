@@ -0,0 +1,81 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from simulator import log_writer
+from simulator.models import InteractionLog
+from simulator.views import log_interaction
+
+BENCH_PREFIX = "bench_db_writes_"
+MOODS = ["HAPPY", "SAD", "ANGRY", "NEUTRAL"]
+
+
+class Command(BaseCommand):
+    help = "Insert InteractionLog rows (via log_interaction) from many threads against the configured DB_PROFILE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16, help="Concurrent writer threads")
+        parser.add_argument("--rows", type=int, default=200, help="Rows written per worker")
+        parser.add_argument("--buffered", action="store_true",
+                            help="Queue rows through a LogWriter (latency is then the enqueue time)")
+
+    def handle(self, *args, **options):
+        workers, rows = options["workers"], options["rows"]
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        users = [User.objects.create_user(username="{}{}".format(BENCH_PREFIX, i)) for i in range(workers)]
+        latencies, errors = [], []
+        lock = threading.Lock()
+        writer = log_writer.LogWriter(
+            batch_size=settings.LOG_WRITER_BATCH_SIZE, flush_ms=settings.LOG_WRITER_FLUSH_MS,
+            max_queue=settings.LOG_WRITER_MAX_QUEUE, overflow=settings.LOG_WRITER_OVERFLOW,
+        ) if options["buffered"] else None
+
+        def write(user):
+            local, failed = [], []
+            try:
+                for i in range(rows):
+                    start = time.perf_counter()
+                    try:
+                        if writer:
+                            writer.submit(user.pk, "Grocery Store", MOODS[i % 4], False)
+                        else:
+                            log_interaction(user, "Grocery Store", {"status": "success", "mood": MOODS[i % 4]})
+                    except OperationalError as e:
+                        failed.append(str(e))
+                    local.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local)
+                errors.extend(failed)
+
+        try:
+            start = time.perf_counter()
+            # The unbuffered run measures the direct write path regardless of INTERACTION_LOG_BUFFERED
+            with override_settings(INTERACTION_LOG_BUFFERED=False), ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(write, users))
+            if writer:
+                writer.stop()  # drained rows count towards the elapsed time
+            elapsed = time.perf_counter() - start
+            written = InteractionLog.objects.filter(user__in=users).count()
+        finally:
+            User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+        latencies.sort()
+        self.stdout.write(
+            "profile={} buffered={} vendor={} workers={} rows={} written={} errors={} throughput={:.0f} rows/s "
+            "p50={:.2f}ms p95={:.2f}ms p99={:.2f}ms".format(
+                settings.DB_PROFILE, bool(writer), connection.vendor, workers, workers * rows, written, len(errors),
+                written / elapsed, statistics.median(latencies) * 1000,
+                latencies[int(len(latencies) * 0.95) - 1] * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            )
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING("First error: {}".format(errors[0])))
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from simulator.models import PracticeSession
+
+BENCH_USERNAME = "bench_end_practice"
+
+
+def transcript(length):
+    """A synthetic practice transcript alternating child and character lines."""
+    messages = []
+    for i in range(length):
+        if i % 2:
+            messages.append({"sender": "assistant", "text": "Sure, the apples are in aisle {}!".format(i), "mood": "HAPPY"})
+        else:
+            messages.append({"sender": "user", "text": "Excuse me, where can I find apples? ({})".format(i)})
+    return messages
+
+
+class Command(BaseCommand):
+    help = "Time /api/practice/end/ (session + transcript write) for growing transcript lengths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lengths", default="10,50,200,1000", help="Comma-separated transcript lengths")
+        parser.add_argument("--runs", type=int, default=20, help="Sessions written per length")
+
+    def handle(self, *args, **options):
+        lengths = [int(n) for n in options["lengths"].split(",") if n.strip()]
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create_user(username=BENCH_USERNAME)
+        client = APIClient()
+        client.force_authenticate(user)
+        try:
+            for length in lengths:
+                payload = {"scenario": "Grocery Store", "messages": transcript(length), "total_messages": length}
+                timings = []
+                for _ in range(options["runs"]):
+                    start = time.perf_counter()
+                    response = client.post("/api/practice/end/", payload, format="json", HTTP_HOST="localhost")
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError("/api/practice/end/ returned {}".format(response.status_code))
+                self.stdout.write("messages={:5d}  p50={:7.1f}ms  max={:7.1f}ms  per_message={:.3f}ms".format(
+                    length, statistics.median(timings), max(timings), statistics.median(timings) / max(length, 1)))
+        finally:
+            PracticeSession.objects.filter(user=user).delete()
+            user.delete()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import daily_stats
+
+
+class Command(BaseCommand):
+    help = "Compare UserDailyStats rollups with the raw InteractionLog rows and report differences."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only this user id (repeatable); default is every user")
+        parser.add_argument("--fix", action="store_true", help="Backfill the affected users afterwards")
+
+    def handle(self, *args, **options):
+        bad_users = set()
+        for (user_id, date, scenario), expected, actual in daily_stats.mismatches(options["user_ids"]):
+            bad_users.add(user_id)
+            self.stdout.write("user={} date={} scenario={!r}: logs={} rollup={}".format(
+                user_id, date, scenario, expected, actual))
+        if not bad_users:
+            self.stdout.write(self.style.SUCCESS("Rollups match the interaction logs"))
+            return
+        if options["fix"]:
+            daily_stats.backfill(sorted(bad_users))
+            self.stdout.write(self.style.SUCCESS("Backfilled {} user(s)".format(len(bad_users))))
+            return
+        raise CommandError("Rollups differ from the logs for {} user(s); rerun with --fix".format(len(bad_users)))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from simulator import transcripts
+from simulator.models import PracticeSession, PracticeSessionMessage
+
+
+class Command(BaseCommand):
+    help = "Convert stored practice transcripts between message rows and compact blobs (see COMPACT_TRANSCRIPTS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to", choices=["compact", "rows"], default="compact", help="Target storage format")
+        parser.add_argument("--batch-size", type=int, default=500, help="Sessions converted per transaction")
+
+    def handle(self, *args, **options):
+        if options["to"] == "compact":
+            sessions = PracticeSession.objects.filter(transcript_blob__isnull=True, messages__isnull=False).distinct()
+            convert = self._compact
+        else:
+            sessions = PracticeSession.objects.filter(transcript_blob__isnull=False)
+            convert = self._expand
+
+        converted = 0
+        while True:
+            batch = list(sessions.order_by("id")[:options["batch_size"]])
+            if not batch:
+                break
+            with transaction.atomic():
+                for session in batch:
+                    convert(session)
+            converted += len(batch)
+        self.stdout.write(self.style.SUCCESS("Converted {} session(s) to {}".format(converted, options["to"])))
+
+    def _compact(self, session):
+        rows = session.messages.order_by("order", "id")
+        messages = [{"sender": m.sender, "text": m.text, "mood": m.mood} for m in rows
+                    if m.sender in transcripts.SENDERS]
+        PracticeSession.objects.filter(id=session.id).update(transcript_blob=transcripts.encode(messages))
+        rows.delete()
+
+    def _expand(self, session):
+        PracticeSessionMessage.objects.bulk_create([
+            PracticeSessionMessage(session=session, sender=m["sender"], text=m["text"], mood=m["mood"] or "", order=i)
+            for i, m in enumerate(transcripts.decode(session.transcript_blob))
+        ])
+        PracticeSession.objects.filter(id=session.id).update(transcript_blob=None)
@@ -0,0 +1,200 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from simulator import llm, log_writer, scheduling, utils
+
+USERNAME_PREFIX = "loadtest_"
+SCENARIOS = ["Grocery Store", "Playground", "Classroom"]
+MESSAGES = [
+    "Hello! Can you help me please?",
+    "Where can I find the apples?",
+    "Thank you so much!",
+    "I lost my mom, can you help me find her?",
+    "Can I play with you?",
+    "You are stupid",  # exercises the flagged path
+    "Excuse me, what time is it?",
+    "I like your shirt",
+]
+
+
+def _json(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class LocalTransport:
+    """Drives the app in-process through the Django test client (one client per thread)."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def create_child(self, name):
+        user = User.objects.create_user(username=name)
+        return Token.objects.create(user=user).key
+
+    def request(self, method, path, body, token):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client(HTTP_HOST="localhost")
+        headers = {"Authorization": "Token " + token}
+        if method == "GET":
+            response = client.get(path, headers=headers)
+        else:
+            response = client.post(path, json.dumps(body), content_type="application/json", headers=headers)
+        return response.status_code, _json(response.content)
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+
+class HTTPTransport:
+    """Drives a running server over HTTP; start it with LLM_PROVIDER=stub to keep the LLM out of it."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def _call(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        if token:
+            request.add_header("Authorization", "Token " + token)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def create_child(self, name):
+        password = uuid.uuid4().hex
+        self._call("POST", "/api/signup/", {"username": name, "password": password})
+        status, body = self._call("POST", "/api/login/", {"username": name, "password": password})
+        if status != 200:
+            raise CommandError("Could not log in {}: HTTP {}".format(name, status))
+        return json.loads(body)["token"]
+
+    def request(self, method, path, body, token):
+        status, content = self._call(method, path, body, token)
+        return status, _json(content)
+
+    def cleanup(self):
+        pass  # remote test users are left in place
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate many children chatting, ending practice and opening the dashboard; report throughput "
+        "and p50/p95/p99 latency per endpoint. Runs in-process with the stub LLM unless --base-url is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--children", type=int, default=50, help="Simulated children (one session each)")
+        parser.add_argument("--turns", type=int, default=10, help="Chat turns per child")
+        parser.add_argument("--concurrency", type=int, default=16, help="Children active at the same time")
+        parser.add_argument("--base-url", help="Load-test a running server instead, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--latency-ms", type=float, default=300, help="In-process stub LLM latency per call")
+        parser.add_argument("--jitter-ms", type=float, default=200, help="In-process stub LLM extra random latency")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="In-process stub LLM failure probability")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--stub-rpm", type=int, default=0,
+                            help="In-process stub LLM rejects calls beyond this many per minute (429)")
+        parser.add_argument("--rpm", type=float, default=0, help="In-process LLM scheduler requests/min (0: no limit)")
+        parser.add_argument("--tpm", type=float, default=0, help="In-process LLM scheduler tokens/min (0: no limit)")
+        parser.add_argument("--burst-seconds", type=float, default=60, help="In-process LLM scheduler bucket size")
+
+    def handle(self, *args, **options):
+        saved = None
+        if options["base_url"]:
+            transport = HTTPTransport(options["base_url"])
+        else:
+            transport = LocalTransport()
+            transport.cleanup()
+            saved = utils.provider, utils.scheduler
+            utils.provider = llm.StubProvider(
+                latency_ms=options["latency_ms"], jitter_ms=options["jitter_ms"],
+                error_rate=options["error_rate"], seed=options["seed"], rate_limit=options["stub_rpm"],
+            )
+            utils.scheduler = scheduling.LLMScheduler(
+                requests_per_minute=options["rpm"], tokens_per_minute=options["tpm"],
+                burst_seconds=options["burst_seconds"],
+            )
+
+        timings = defaultdict(list)
+        failures = defaultdict(int)
+        lock = threading.Lock()
+        run_id = uuid.uuid4().hex[:6]
+
+        def timed(method, path, body, token):
+            start = time.perf_counter()
+            status, data = transport.request(method, path, body, token)
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings[path].append(elapsed)
+                # The chat endpoints report LLM failures as 200 with status "error"
+                if status >= 400 or (isinstance(data, dict) and data.get("status") == "error"):
+                    failures[path] += 1
+            return data if isinstance(data, dict) else {}
+
+        def child(index):
+            try:
+                token = transport.create_child("{}{}_{}".format(USERNAME_PREFIX, run_id, index))
+                scenario = SCENARIOS[index % len(SCENARIOS)]
+                conversation_id = None
+                for turn in range(options["turns"]):
+                    message = MESSAGES[(index + turn) % len(MESSAGES)]
+                    body = {"message": message, "scenario": scenario, "conversation_id": conversation_id}
+                    conversation_id = timed("POST", "/api/chat/", body, token).get("conversation_id", conversation_id)
+                timed("POST", "/api/practice/end/", {"scenario": scenario, "conversation_id": conversation_id,
+                                                     "total_messages": options["turns"]}, token)
+                timed("GET", "/api/analytics/", None, token)
+            finally:
+                if isinstance(transport, LocalTransport):
+                    connection.close()
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                list(pool.map(child, range(options["children"])))
+        finally:
+            elapsed = time.perf_counter() - start
+            if not options["base_url"]:
+                stub, scheduler = utils.provider, utils.scheduler
+                utils.provider, utils.scheduler = saved
+                log_writer.get_writer().stop()  # queued analytics rows reference the test users
+                transport.cleanup()
+
+        self.stdout.write("{} children x {} turns, concurrency {}, {:.1f}s".format(
+            options["children"], options["turns"], options["concurrency"], elapsed))
+        for path in ("/api/chat/", "/api/practice/end/", "/api/analytics/"):
+            values = sorted(timings[path])
+            self.stdout.write(
+                "{:20s} n={:5d} errors={:4d} throughput={:7.1f}/s p50={:7.1f}ms p95={:7.1f}ms p99={:7.1f}ms".format(
+                    path, len(values), failures[path], len(values) / elapsed,
+                    statistics.median(values) * 1000 if values else 0,
+                    percentile(values, 0.95) * 1000, percentile(values, 0.99) * 1000,
+                )
+            )
+        if not options["base_url"]:
+            self.stdout.write("stub LLM: {} calls, {} rejected as rate-limited; scheduler: {}".format(
+                stub.calls, stub.rejected, scheduler.stats()))
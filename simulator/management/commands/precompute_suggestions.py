@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import suggestions_cache, transcripts, utils
+
+
+class Command(BaseCommand):
+    help = "Precompute suggestion chips for the most frequent character lines in practice transcripts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=500, help="Number of most frequent (scenario, line) pairs")
+        parser.add_argument("--min-count", type=int, default=2, help="Only lines seen at least this many times")
+        parser.add_argument("--dry-run", action="store_true", help="List the lines without calling the LLM")
+
+    def handle(self, *args, **options):
+        if utils.provider is None and not options["dry_run"]:
+            raise CommandError("No LLM provider configured (set MISTRAL_API_KEY or LLM_PROVIDER)")
+
+        counts = transcripts.assistant_line_counts()
+        computed = cached = failed = 0
+        for (scenario, text), n in counts.most_common(options["limit"]):
+            if n < options["min_count"]:
+                break
+            if suggestions_cache.lookup(scenario, text) is not None:
+                cached += 1
+                continue
+            if options["dry_run"]:
+                self.stdout.write("{} x{}: {}".format(scenario, n, text[:80]))
+                continue
+            if utils.fill_suggestions(scenario, text):
+                computed += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            "Suggestions: {} computed, {} already cached, {} failed".format(computed, cached, failed)
+        ))
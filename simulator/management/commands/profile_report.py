@@ -0,0 +1,59 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import profiling
+
+SORT_KEYS = {
+    "p95": "p95_ms",
+    "queries": "avg_queries",
+    "query-time": "avg_query_ms",
+    "duplicates": "duplicate_count",
+}
+
+
+class Command(BaseCommand):
+    help = "Summarize the slowest and most query-heavy endpoints from ProfilingMiddleware samples."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", help="Profiling directory (default: PROFILING_DIR)")
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="p95", help="Rank endpoints by this")
+        parser.add_argument("--limit", type=int, default=10, help="Number of endpoints to show")
+        parser.add_argument("--functions", type=int, default=0,
+                            help="Also print this many top functions (cumulative time) from each endpoint's cProfile dump")
+
+    def handle(self, *args, **options):
+        samples = profiling.load_samples(options["dir"])
+        if not samples:
+            raise CommandError("No profiling samples found; set PROFILING_SAMPLE_RATE and send some requests")
+
+        rows = profiling.summarize(samples)
+        for row in rows:
+            row["duplicate_count"] = sum(n for _, n in row["duplicates"])
+        rows.sort(key=lambda r: r[SORT_KEYS[options["sort"]]], reverse=True)
+
+        self.stdout.write("{} sampled requests, {} endpoints".format(len(samples), len(rows)))
+        self.stdout.write("{:28s} {:>6s} {:>9s} {:>9s} {:>9s} {:>8s} {:>8s} {:>9s}".format(
+            "endpoint", "reqs", "p50 ms", "p95 ms", "max ms", "queries", "max q", "query ms"))
+        for row in rows[:options["limit"]]:
+            self.stdout.write("{:28s} {:6d} {:9.1f} {:9.1f} {:9.1f} {:8.1f} {:8d} {:9.1f}".format(
+                row["endpoint"][:28], row["requests"], row["p50_ms"], row["p95_ms"], row["max_ms"],
+                row["avg_queries"], row["max_queries"], row["avg_query_ms"]))
+            for sql, extra in row["duplicates"]:
+                self.stdout.write(self.style.WARNING("    {}x repeated: {}".format(extra, sql[:120])))
+            if options["functions"]:
+                self._functions(row["endpoint"], options["dir"], options["functions"])
+
+    def _functions(self, endpoint, directory, limit):
+        stats = profiling.load_profile(endpoint, directory)
+        if stats is None:
+            return
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(limit)
+        # Skip pstats' header lines; keep the table
+        lines = out.getvalue().splitlines()
+        start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+        for line in lines[start:]:
+            if line.strip():
+                self.stdout.write("    " + line)
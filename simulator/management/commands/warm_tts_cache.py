@@ -0,0 +1,55 @@
+from collections import Counter
+from urllib.error import HTTPError, URLError
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import transcripts, tts
+from simulator.utils import DEFAULT_SUGGESTIONS
+
+
+class Command(BaseCommand):
+    help = "Pre-warm the TTS audio cache with the most frequent assistant lines from practice transcripts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=200, help="Number of most frequent lines to synthesize")
+        parser.add_argument("--min-count", type=int, default=2, help="Only lines seen at least this many times")
+        parser.add_argument("--dry-run", action="store_true", help="List the lines without calling ElevenLabs")
+
+    def handle(self, *args, **options):
+        api_key = tts.get_api_key()
+        if not api_key and not options["dry_run"]:
+            raise CommandError("ELEVENLABS_API_KEY is not configured")
+        voice_id = tts.get_voice_id()
+        cache = tts.get_cache()
+
+        # The same line is spoken with the same voice in every scenario
+        lines = Counter()
+        for (_, text), n in transcripts.assistant_line_counts().items():
+            lines[text] += n
+        frequent = [text for text, n in lines.most_common(options["limit"]) if n >= options["min_count"]]
+        texts = list(DEFAULT_SUGGESTIONS) + frequent
+
+        seen = set()
+        warmed = cached = failed = 0
+        for raw in texts:
+            text = tts.normalize_text(raw)
+            if not text or text in seen:
+                continue
+            seen.add(text)
+            key = tts.cache_key(text, voice_id)
+            if cache.get(key) is not None:
+                cached += 1
+                continue
+            if options["dry_run"]:
+                self.stdout.write(text)
+                continue
+            try:
+                cache.put(key, tts.fetch_speech(text, voice_id, api_key))
+                warmed += 1
+            except (HTTPError, URLError) as e:
+                failed += 1
+                self.stderr.write("Failed: {!r} ({})".format(text[:60], e))
+
+        self.stdout.write(self.style.SUCCESS(
+            "TTS cache: {} synthesized, {} already cached, {} failed".format(warmed, cached, failed)
+        ))
@@ -0,0 +1,332 @@
+"""
+Per-request timing and usage metrics for the chat pipeline, exported in Prometheus text format.
+
+Each stage of a chat turn (vibe_check, roleplay, suggestions, summary, db_log) is timed with
+`stage(name)`; LLM token usage, cache hits/misses and outbound retries are counted against
+the stage that was running. Cache, conversation history, log writer and LLM scheduler
+counters are registered here too, rather than kept by each module. Everything feeds two places:
+
+- process-wide counters and histograms, rendered by `render()` for the /metrics endpoint
+  (one registry per process: scrape every worker, or aggregate in Prometheus);
+- the current request's RequestMetrics (started by MetricsMiddleware), which becomes the
+  Server-Timing header when SERVER_TIMING is on.
+
+Work submitted to the LLM pool carries the request context along (utils._submit), so
+stages that run on worker threads are still attributed to the request that started them.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} counter".format(self.name)]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append("{}{} {}".format(self.name, _format_labels(self.labelnames, key), _format_value(value)))
+        return lines
+
+
+class Tally:
+    """
+    Counts kept for one object (a LogWriter, an LLMScheduler) that also feed a registered
+    Counter, so the object's stats() and /metrics come from the same increments.
+    `label` is the counter label that takes the event name.
+    """
+
+    def __init__(self, counter, label, names):
+        self.counter = counter
+        self.label = label
+        self._values = dict.fromkeys(names, 0)
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._values[name] += amount
+        self.counter.inc(amount, **{self.label: name}, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}  # label values -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return entry[2] if entry else 0
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} histogram".format(self.name)]
+        with self._lock:
+            items = sorted((key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append("{}_bucket{} {}".format(self.name, labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            lines.append("{}_sum{} {}".format(self.name, labels, _format_value(total)))
+            lines.append("{}_count{} {}".format(self.name, labels, n))
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "sociable_http_request_duration_seconds", "Time to produce a response, by view, method and status.",
+    ("view", "method", "status"))
+STAGE_SECONDS = Histogram(
+    "sociable_stage_duration_seconds", "Wall time of one pipeline stage (vibe_check, roleplay, suggestions, ...).",
+    ("stage",))
+STAGE_ERRORS = Counter("sociable_stage_errors_total", "Pipeline stages that ended with an exception.", ("stage",))
+LLM_TOKENS = Counter(
+    "sociable_llm_tokens_total", "LLM tokens reported by the provider, by stage and kind (prompt, completion).",
+    ("stage", "kind"))
+CACHE_LOOKUPS = Counter(
+    "sociable_cache_lookups_total", "Cache lookups by cache (vibe, suggestions, tts) and result.", ("cache", "result"))
+RETRIES = Counter("sociable_outbound_retries_total", "Outbound calls retried after a retryable failure.", ("stage",))
+HISTORY_PROMPTS = Counter("sociable_history_prompts_total", "Roleplay prompts built from a held conversation.")
+HISTORY_TOKENS = Counter(
+    "sociable_history_tokens_total",
+    "Roleplay history tokens: sent (kept turns plus summary) and full (the whole history). Saved = full - sent.",
+    ("kind",))
+HISTORY_SUMMARIES = Counter("sociable_history_summaries_total", "Rolling conversation summaries written.")
+LOG_WRITER_EVENTS = Counter(
+    "sociable_log_writer_total",
+    "Buffered interaction log writer: rows queued, written, written_sync, dropped and failed, and batch flushes.",
+    ("event",))
+SCHEDULER_CALLS = Counter(
+    "sociable_llm_scheduler_total",
+    "LLM calls by kind and scheduler outcome (admitted, waited, coalesced, shed, timed_out, rate_limited).",
+    ("kind", "outcome"))
+
+REGISTRY = [
+    REQUEST_SECONDS, STAGE_SECONDS, STAGE_ERRORS, LLM_TOKENS, CACHE_LOOKUPS, RETRIES,
+    HISTORY_PROMPTS, HISTORY_TOKENS, HISTORY_SUMMARIES, LOG_WRITER_EVENTS, SCHEDULER_CALLS,
+]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render():
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- Per-request record ----
+
+class RequestMetrics:
+    """What one request spent: seconds per stage, tokens, cache results, retries and stage errors."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.cache = {}
+        self.retries = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds, failed=False):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.errors += failed
+
+    def add_tokens(self, prompt, completion):
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["completion"] += completion
+
+    def add_cache(self, name, result):
+        with self._lock:
+            self.cache[name] = result
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def server_timing(self):
+        """The Server-Timing header value: one entry per stage, cache results, tokens and the total."""
+        with self._lock:
+            parts = ["{};dur={:.1f}".format(name, seconds * 1000) for name, seconds in self.stages.items()]
+            parts += ['{}_cache;desc="{}"'.format(name, result) for name, result in self.cache.items()]
+            if self.tokens["prompt"] or self.tokens["completion"]:
+                parts.append('llm_tokens;desc="prompt={} completion={}"'.format(
+                    self.tokens["prompt"], self.tokens["completion"]))
+            if self.retries:
+                parts.append('retries;desc="{}"'.format(self.retries))
+        parts.append("total;dur={:.1f}".format((time.perf_counter() - self.started) * 1000))
+        return ", ".join(parts)
+
+
+_request = contextvars.ContextVar("request_metrics", default=None)
+_stage = contextvars.ContextVar("metrics_stage", default="")
+
+
+def start_request():
+    """Start collecting for the current context. Returns (record, token); pass the token to end_request."""
+    record = RequestMetrics()
+    return record, _request.set(record)
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+def current():
+    """The current request's RequestMetrics, or None outside a request."""
+    return _request.get()
+
+
+def current_stage():
+    return _stage.get() or "other"
+
+
+def _finish_stage(name, seconds, failed):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if failed:
+        STAGE_ERRORS.inc(stage=name)
+    record = _request.get()
+    if record is not None:
+        record.add_stage(name, seconds, failed)
+
+
+def observe_stage(name, seconds):
+    """Record `seconds` spent in stage `name` without timing a block (e.g. queueing for the LLM)."""
+    _finish_stage(name, seconds, False)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as pipeline stage `name`; an exception counts as a stage error."""
+    token = _stage.set(name)
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _stage.reset(token)
+        _finish_stage(name, time.perf_counter() - started, failed)
+
+
+def timed_iter(name, iterable):
+    """
+    Yield from `iterable` as stage `name`, timing only the time spent producing items
+    (not the time the consumer holds each one), for streamed LLM replies.
+    """
+    iterator = iter(iterable)
+    elapsed, failed = 0.0, False
+    try:
+        while True:
+            token = _stage.set(name)
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                elapsed += time.perf_counter() - started
+                _stage.reset(token)
+            yield item
+    finally:
+        _finish_stage(name, elapsed, failed)
+
+
+def record_tokens(prompt, completion):
+    """Count LLM usage (from the provider's `usage` fields) against the current stage."""
+    name = current_stage()
+    LLM_TOKENS.inc(prompt or 0, stage=name, kind="prompt")
+    LLM_TOKENS.inc(completion or 0, stage=name, kind="completion")
+    record = _request.get()
+    if record is not None:
+        record.add_tokens(prompt or 0, completion or 0)
+
+
+def record_usage(usage):
+    """record_tokens from a Mistral `usage` object; missing usage is ignored."""
+    if usage is not None:
+        record_tokens(getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0))
+
+
+def record_cache(name, result):
+    CACHE_LOOKUPS.inc(cache=name, result=result)
+    record = _request.get()
+    if record is not None:
+        record.add_cache(name, result)
+
+
+def record_retry():
+    RETRIES.inc(stage=current_stage())
+    record = _request.get()
+    if record is not None:
+        record.add_retry()
@@ -0,0 +1,126 @@
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import http_client, metrics, profiling
+
+
+class RequestDeadlineMiddleware:
+    """
+    Starts the outbound-call deadline for each request (REQUEST_BUDGET_SECONDS), so
+    LLM and TTS calls made while handling it share one time budget.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = http_client.start_deadline(settings.REQUEST_BUDGET_SECONDS)
+        try:
+            return self.get_response(request)
+        finally:
+            http_client.end_deadline(token)
+
+    async def __acall__(self, request):
+        token = http_client.start_deadline(settings.REQUEST_BUDGET_SECONDS)
+        try:
+            return await self.get_response(request)
+        finally:
+            http_client.end_deadline(token)
+
+
+class MetricsMiddleware:
+    """
+    Collects per-request metrics (see metrics.py): response time by view and status, and the
+    stages, tokens and cache results of the request. With SERVER_TIMING on, non-streaming
+    responses carry them in a Server-Timing header (streamed responses send headers first).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, record)
+
+    async def __acall__(self, request):
+        record, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, record)
+
+    @staticmethod
+    def _finish(request, response, record):
+        match = getattr(request, "resolver_match", None)
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - record.started,
+            view=(match.url_name or match.view_name) if match else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+        if settings.SERVER_TIMING and not response.streaming:
+            response["Server-Timing"] = record.server_timing()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a PROFILING_SAMPLE_RATE fraction of requests (see profiling.py): SQL query count,
+    time and duplicates, plus a cProfile dump per endpoint with PROFILING_CPROFILE.
+    Removed from the chain when the rate is 0. Sync only: while it is enabled, async views
+    are run through async_to_sync so their queries can be recorded on this thread.
+    """
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+        if not self.rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cprofile = getattr(settings, "PROFILING_CPROFILE", False)
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+        recorder = profiling.QueryRecorder()
+        profile = profiling.start_profile() if self.cprofile else None
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            if profile is not None:
+                profile.disable()
+        seconds = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        endpoint = (match.url_name or match.view_name) if match else "unmatched"
+        if profile is not None:
+            profiling.save_profile(profile, endpoint)
+        profiling.save_sample(endpoint, request.method, response.status_code, seconds, recorder)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0003_add_practice_sessions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interactionlog',
+            index=models.Index(fields=['user', 'created_at'], name='interactionlog_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='interactionlog',
+            index=models.Index(fields=['user', 'scenario', 'mood'], name='interactionlog_user_scen_mood'),
+        ),
+    ]
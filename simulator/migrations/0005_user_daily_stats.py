@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Roll up the existing InteractionLog rows, as `manage.py backfill_daily_stats` does (a frozen
+    copy of daily_stats.aggregate), so the dashboard keeps its history after the upgrade.
+    """
+    InteractionLog = apps.get_model('simulator', 'InteractionLog')
+    UserDailyStats = apps.get_model('simulator', 'UserDailyStats')
+    unflagged = Q(flagged=False)
+    rows = (
+        InteractionLog.objects.order_by()
+        .annotate(date=TruncDate('created_at'))
+        .values('user_id', 'date', 'scenario')
+        .annotate(
+            n_total=Count('id'),
+            n_flagged=Count('id', filter=Q(flagged=True)),
+            n_happy=Count('id', filter=unflagged & Q(mood='HAPPY')),
+            n_sad=Count('id', filter=unflagged & Q(mood='SAD')),
+            n_angry=Count('id', filter=unflagged & Q(mood='ANGRY')),
+            n_neutral=Count('id', filter=unflagged & ~Q(mood__in=['HAPPY', 'SAD', 'ANGRY'])),
+        )
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        batch.append(UserDailyStats(
+            user_id=row['user_id'], date=row['date'], scenario=row['scenario'], total=row['n_total'],
+            flagged=row['n_flagged'], happy=row['n_happy'], sad=row['n_sad'], angry=row['n_angry'],
+            neutral=row['n_neutral'],
+        ))
+        if len(batch) == 1000:
+            UserDailyStats.objects.bulk_create(batch)
+            batch = []
+    UserDailyStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0004_interactionlog_analytics_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scenario', models.CharField(max_length=64)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('flagged', models.PositiveIntegerField(default=0)),
+                ('happy', models.PositiveIntegerField(default=0)),
+                ('sad', models.PositiveIntegerField(default=0)),
+                ('angry', models.PositiveIntegerField(default=0)),
+                ('neutral', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'scenario'), name='userdailystats_unique_day')],
+            },
+        ),
+        # Reversing drops the table, so there is nothing to undo
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
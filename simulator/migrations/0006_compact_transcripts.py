@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:32
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+# Frozen copy of the version 1 transcript format (simulator/transcripts.py at the time of this
+# migration), so what the migration writes does not depend on later changes to the encoder.
+FORMAT_VERSION = 1
+SENDERS = ('user', 'assistant')
+MOODS = ('', 'HAPPY', 'SAD', 'ANGRY', 'NEUTRAL')
+
+
+def encode(messages):
+    rows = []
+    for m in messages:
+        mood = m.get('mood') or ''
+        rows.append([
+            SENDERS.index(m['sender']),
+            MOODS.index(mood) if mood in MOODS else mood,
+            m.get('text') or '',
+        ])
+    payload = json.dumps([FORMAT_VERSION, rows], ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), 6)
+
+
+def decode(blob):
+    version, rows = json.loads(zlib.decompress(bytes(blob)).decode('utf-8'))
+    if version != FORMAT_VERSION:
+        raise ValueError("Unknown transcript format version {}".format(version))
+    return [
+        {
+            "sender": SENDERS[sender],
+            "text": text,
+            "mood": (MOODS[mood] if isinstance(mood, int) else mood) or None,
+        }
+        for sender, mood, text in rows
+    ]
+
+
+def compact_existing(apps, schema_editor):
+    """
+    Fold existing message rows into transcript blobs, whatever COMPACT_TRANSCRIPTS is set to;
+    `manage.py convert_transcripts --to rows` converts them back.
+    """
+    PracticeSession = apps.get_model('simulator', 'PracticeSession')
+    PracticeSessionMessage = apps.get_model('simulator', 'PracticeSessionMessage')
+    session_ids = (
+        PracticeSessionMessage.objects.filter(session__transcript_blob__isnull=True)
+        .values_list('session_id', flat=True).distinct().order_by()
+    )
+    for session_id in list(session_ids):
+        rows = PracticeSessionMessage.objects.filter(session_id=session_id).order_by('order', 'id')
+        messages = [{"sender": m.sender, "text": m.text, "mood": m.mood} for m in rows if m.sender in SENDERS]
+        PracticeSession.objects.filter(id=session_id).update(transcript_blob=encode(messages))
+        rows.delete()
+
+
+def expand_blobs(apps, schema_editor):
+    """Turn transcript blobs back into message rows (before the column is dropped)."""
+    PracticeSession = apps.get_model('simulator', 'PracticeSession')
+    PracticeSessionMessage = apps.get_model('simulator', 'PracticeSessionMessage')
+    for session in PracticeSession.objects.filter(transcript_blob__isnull=False).iterator():
+        PracticeSessionMessage.objects.bulk_create([
+            PracticeSessionMessage(session=session, sender=m['sender'], text=m['text'],
+                                   mood=m['mood'] or '', order=i)
+            for i, m in enumerate(decode(session.transcript_blob))
+        ])
+        PracticeSession.objects.filter(id=session.id).update(transcript_blob=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0005_user_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='practicesession',
+            name='transcript_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(compact_existing, expand_blobs),
+    ]
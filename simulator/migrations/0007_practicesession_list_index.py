@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0006_compact_transcripts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='practicesession',
+            index=models.Index(fields=['user', '-ended_at', '-id'], name='practicesession_user_ended'),
+        ),
+    ]
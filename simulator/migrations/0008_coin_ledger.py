@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    """Start every existing balance with an 'opening' ledger entry so the ledger sums to it."""
+    UserProfile = apps.get_model('simulator', 'UserProfile')
+    CoinTransaction = apps.get_model('simulator', 'CoinTransaction')
+    CoinTransaction.objects.bulk_create([
+        CoinTransaction(user_id=user_id, kind='opening', amount=coins, balance_after=coins)
+        for user_id, coins in UserProfile.objects.filter(coins__gt=0).values_list('user_id', 'coins')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0007_practicesession_list_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('amount', models.IntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('reward_id', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='cointransaction_user_created')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('kind', 'redeem')), fields=('user', 'reward_id'), name='cointransaction_redeem_once')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
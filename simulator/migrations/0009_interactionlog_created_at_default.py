@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0008_coin_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interactionlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import transcripts
 
 
 class InteractionLog(models.Model):
@@ -8,10 +12,34 @@ class InteractionLog(models.Model):
     scenario = models.CharField(max_length=64)
     mood = models.CharField(max_length=16, blank=True)  # HAPPY, SAD, ANGRY, NEUTRAL, or '' for flagged/error
     flagged = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # When the chat turn happened; set explicitly by the buffered log writer, which saves rows later
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='interactionlog_user_created'),
+            models.Index(fields=['user', 'scenario', 'mood'], name='interactionlog_user_scen_mood'),
+        ]
+
+
+class UserDailyStats(models.Model):
+    """Per-user, per-day, per-scenario counts rolled up from InteractionLog for the dashboard."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    scenario = models.CharField(max_length=64)
+    total = models.PositiveIntegerField(default=0)
+    flagged = models.PositiveIntegerField(default=0)
+    happy = models.PositiveIntegerField(default=0)
+    sad = models.PositiveIntegerField(default=0)
+    angry = models.PositiveIntegerField(default=0)
+    neutral = models.PositiveIntegerField(default=0)  # also counts unflagged logs with no mood
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'scenario'], name='userdailystats_unique_day'),
+        ]
 
 
 class UserProfile(models.Model):
@@ -24,6 +52,48 @@ class UserProfile(models.Model):
         ordering = ['user']
 
 
+class CoinTransaction(models.Model):
+    """
+    Append-only coin ledger: every award and redemption, with the balance right after it.
+    The sum of `amount` per user equals UserProfile.coins (see `manage.py audit_coins`).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='coin_transactions')
+    kind = models.CharField(max_length=16)  # 'opening', 'award' or 'redeem'
+    amount = models.IntegerField()  # positive for awards, negative for redemptions
+    balance_after = models.PositiveIntegerField()
+    reward_id = models.CharField(max_length=64, blank=True)  # for redemptions
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='cointransaction_user_created'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'reward_id'], condition=models.Q(kind='redeem'), name='cointransaction_redeem_once',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Coin transactions are append-only")
+        super().save(*args, **kwargs)
+
+
+class Conversation(models.Model):
+    """A server-held chat conversation (simulator/conversations.py): compact turns plus the trim count."""
+    id = models.CharField(max_length=32, primary_key=True)  # uuid4 hex, sent to the client
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations')
+    scenario = models.CharField(max_length=64)
+    turns = models.JSONField(default=list)  # [sender, text, mood] lists
+    trimmed = models.PositiveIntegerField(default=0)  # turns dropped off the front past MAX_TURNS
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)  # expires CONVERSATION_TTL after
+
+    class Meta:
+        ordering = ['-updated_at']
+
+
 class PracticeSession(models.Model):
     """One practice session (one scenario), logged when user ends practice for parent review."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='practice_sessions')
@@ -34,9 +104,21 @@ class PracticeSession(models.Model):
     kind_moments = models.PositiveIntegerField(default=0)
     flagged_count = models.PositiveIntegerField(default=0)
     hurt_moments = models.PositiveIntegerField(default=0)
+    # Whole transcript as one compressed blob (COMPACT_TRANSCRIPTS); None when stored as message rows
+    transcript_blob = models.BinaryField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['-ended_at']
+        indexes = [
+            models.Index(fields=['user', '-ended_at', '-id'], name='practicesession_user_ended'),
+        ]
+
+    @cached_property
+    def transcript(self):
+        """Messages as {sender, text, mood} dicts, decoded on first access from the blob or the rows."""
+        if self.transcript_blob is not None:
+            return transcripts.decode(self.transcript_blob)
+        return [{"sender": m.sender, "text": m.text, "mood": m.mood or None} for m in self.messages.all()]
 
 
 class PracticeSessionMessage(models.Model):
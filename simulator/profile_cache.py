@@ -0,0 +1,81 @@
+"""
+Per-user cached profile snapshot: coins and purchased reward ids.
+
+/profile/ and /shop/ are polled often by the app, so they read this snapshot instead of the
+UserProfile row. Snapshots are stored under a per-user generation number that coins.award and
+coins.redeem bump inside their transaction and again when it commits, so the next read misses
+and repopulates it. A reader that loaded the row before the commit writes its (old) snapshot
+under a retired generation, where nothing looks any more, instead of over the fresh one.
+
+Stored in the default Django cache for PROFILE_CACHE_TTL, and only when that cache is shared
+between processes (caching.is_shared); otherwise every read goes to the profile row.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import caching
+from .models import UserProfile
+
+
+def _generation_key(user_id):
+    return "profile:{}:generation".format(user_id)
+
+
+def _key(user_id, generation):
+    return "profile:{}:{}".format(user_id, generation)
+
+
+def _ttl():
+    return getattr(settings, "PROFILE_CACHE_TTL", 5 * 60)
+
+
+def _generation(user_id):
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock, not 0, so a lost generation cannot revive snapshots written under it
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _load(user):
+    profile, _ = UserProfile.objects.get_or_create(user=user, defaults={"coins": 0})
+    purchased = list(profile.purchased_reward_ids or [])
+    return {"coins": profile.coins, "purchased_reward_ids": purchased, "owned": frozenset(purchased)}
+
+
+def snapshot(user):
+    """
+    {"coins", "purchased_reward_ids" (purchase order), "owned" (frozenset)} for `user`,
+    from the cache or the profile row (created on first use).
+    """
+    if not caching.is_shared():
+        return _load(user)
+    key = _key(user.pk, _generation(user.pk))
+    data = cache.get(key)
+    if data is None:
+        data = _load(user)
+        cache.set(key, data, _ttl())
+    return data
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:  # no generation yet (or it was evicted)
+        cache.set(_generation_key(user_id), time.time_ns(), None)
+
+
+def invalidate(user_id):
+    """
+    Retire the user's snapshot; call it inside the transaction that changes the row. The
+    generation is bumped now, for reads that started earlier, and again on commit, for reads
+    made while the change was not yet visible.
+    """
+    if caching.is_shared():
+        _bump(user_id)
+        transaction.on_commit(lambda: _bump(user_id))
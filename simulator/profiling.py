@@ -0,0 +1,156 @@
+"""
+Sampled request profiling: SQL query accounting and optional cProfile dumps per endpoint.
+
+ProfilingMiddleware (middleware.py) profiles PROFILING_SAMPLE_RATE of requests (0 turns it
+off). For each sampled request it counts the queries run on every database connection, their
+total time and the statements repeated within the request (the N+1 pattern), and appends one
+JSON line to PROFILING_DIR/requests.jsonl. With PROFILING_CPROFILE on, the request thread also
+runs under cProfile (LLM pool threads are not included), merged into PROFILING_DIR/<endpoint>.<pid>.prof.
+
+`manage.py profile_report` summarizes the worst endpoints from those files.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+SAMPLES_FILE = "requests.jsonl"
+MAX_SQL_LENGTH = 300
+_write_lock = threading.Lock()
+
+
+def directory():
+    return Path(getattr(settings, "PROFILING_DIR", Path(settings.BASE_DIR) / "profiles"))
+
+
+class QueryRecorder:
+    """
+    A connection.execute_wrapper that counts queries and their time. Statements are grouped by
+    SQL text (parameters stripped); `identical` also matches the parameters.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self.identical = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.count += 1
+                self.seconds += elapsed
+                self.statements[sql] += 1
+                self.identical[(sql, repr(params))] += 1
+
+    def duplicates(self, limit=5):
+        """The statements run more than once, most repeated first, as dicts for the sample line."""
+        with self._lock:
+            identical = Counter()
+            for (sql, _), n in self.identical.items():
+                if n > 1:
+                    identical[sql] += n - 1
+            return [
+                {"sql": sql[:MAX_SQL_LENGTH], "count": n, "identical": identical[sql]}
+                for sql, n in self.statements.most_common() if n > 1
+            ][:limit]
+
+
+def start_profile():
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def save_profile(profile, endpoint):
+    """Merge `profile` (disabled) into this process's dump for `endpoint`."""
+    path = directory() / "{}.{}.prof".format(endpoint, os.getpid())
+    stats = pstats.Stats(profile)
+    with _write_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            stats.add(str(path))
+        stats.dump_stats(str(path))
+
+
+def save_sample(endpoint, method, status, seconds, recorder):
+    sample = {
+        "endpoint": endpoint,
+        "method": method,
+        "status": status,
+        "ms": round(seconds * 1000, 2),
+        "queries": recorder.count,
+        "query_ms": round(recorder.seconds * 1000, 2),
+        "duplicates": recorder.duplicates(),
+        "at": time.time(),
+    }
+    line = json.dumps(sample, separators=(",", ":")) + "\n"
+    with _write_lock:
+        directory().mkdir(parents=True, exist_ok=True)
+        with open(directory() / SAMPLES_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+    return sample
+
+
+def load_samples(path=None):
+    path = Path(path) if path else directory()
+    try:
+        with open(path / SAMPLES_FILE, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(samples):
+    """
+    One row per endpoint: requests, p50/p95/max ms, average and max queries, average query ms,
+    and the most repeated statements across its samples.
+    """
+    grouped = {}
+    for sample in samples:
+        grouped.setdefault(sample["endpoint"], []).append(sample)
+    rows = []
+    for endpoint, group in grouped.items():
+        duplicates = Counter()
+        for sample in group:
+            for dup in sample["duplicates"]:
+                duplicates[dup["sql"]] += dup["count"] - 1
+        rows.append({
+            "endpoint": endpoint,
+            "requests": len(group),
+            "p50_ms": _percentile([s["ms"] for s in group], 0.5),
+            "p95_ms": _percentile([s["ms"] for s in group], 0.95),
+            "max_ms": max(s["ms"] for s in group),
+            "avg_queries": sum(s["queries"] for s in group) / len(group),
+            "max_queries": max(s["queries"] for s in group),
+            "avg_query_ms": sum(s["query_ms"] for s in group) / len(group),
+            "duplicates": duplicates.most_common(3),
+        })
+    return rows
+
+
+def load_profile(endpoint, path=None):
+    """pstats.Stats merged from every process's dump for `endpoint`, or None if there is none."""
+    files = sorted((Path(path) if path else directory()).glob("{}.*.prof".format(endpoint)))
+    if not files:
+        return None
+    stats = pstats.Stats(str(files[0]))
+    for extra in files[1:]:
+        stats.add(str(extra))
+    return stats
@@ -0,0 +1,299 @@
+"""
+Central scheduler for outbound LLM calls; utils.py sends every completion through it.
+
+- Token buckets for requests and tokens per minute (LLM_REQUESTS_PER_MINUTE,
+  LLM_TOKENS_PER_MINUTE; 0 means no limit), each holding at most LLM_BURST_SECONDS worth.
+  Tokens are estimated from the prompt (~4 characters per token) plus a typical completion
+  size for the kind of call.
+- Priorities: the vibe check and the roleplay reply go first, then background summaries; a
+  call keeps waiting while a higher-priority call is waiting.
+- Suggestions never wait. They are shed when admitting them would leave less than
+  LLM_SUGGESTIONS_RESERVE of a bucket, or when anything else is queued, and the turn falls
+  back to the default chips.
+- Identical in-flight vibe checks and suggestion calls share one upstream call.
+- A 429 from the provider pauses all admissions for its Retry-After (or one second).
+
+Waiting is bounded by the request deadline and LLM_SCHEDULER_MAX_WAIT_SECONDS; past that
+SchedulerBusy is raised.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from . import http_client, metrics
+
+VIBE_CHECK = "vibe_check"
+ROLEPLAY = "roleplay"
+SUMMARY = "summary"
+SUGGESTIONS = "suggestions"
+
+PRIORITY = {VIBE_CHECK: 0, ROLEPLAY: 0, SUMMARY: 1, SUGGESTIONS: 2}
+# Typical completion sizes, added to the prompt estimate before a call is admitted
+COMPLETION_TOKENS = {VIBE_CHECK: 2, ROLEPLAY: 80, SUMMARY: 120, SUGGESTIONS: 40}
+COALESCED = frozenset({VIBE_CHECK, SUGGESTIONS})
+SHED = frozenset({SUGGESTIONS})
+# How often a call blocked behind a higher-priority one checks again
+POLL_SECONDS = 0.01
+
+
+class SchedulerBusy(Exception):
+    """A call was not admitted: shed under pressure, or it could not be admitted in time."""
+
+
+def estimate_tokens(kind, messages):
+    prompt = sum(len(m.get("content") or "") for m in messages)
+    return math.ceil(prompt / 4) + COMPLETION_TOKENS.get(kind, 0)
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 units a second, holding at most `burst_seconds` worth."""
+
+    def __init__(self, per_minute, burst_seconds):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` is available (a call bigger than the bucket waits for a full one)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def headroom_after(self, amount):
+        return (self.level - min(amount, self.capacity)) / self.capacity
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+def _rate_limited(e):
+    return getattr(e, "status_code", None) == 429
+
+
+def _retry_after(e):
+    value = getattr(e, "retry_after", None)
+    if value is None:
+        value = http_client.llm_retry_after(e)
+    return value if value is not None else 1.0
+
+
+class LLMScheduler:
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, burst_seconds=60, max_wait=10.0,
+                 suggestions_reserve=0.2):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        self.max_wait = max_wait
+        self.suggestions_reserve = suggestions_reserve
+        self._cond = threading.Condition()
+        self._waiting = [0] * (max(PRIORITY.values()) + 1)
+        self._paused_until = 0.0
+        self._inflight = {}
+        self._tally = metrics.Tally(
+            metrics.SCHEDULER_CALLS, "outcome", ("admitted", "waited", "coalesced", "shed", "timed_out", "rate_limited"))
+
+    def _count(self, kind, outcome):
+        self._tally.inc(outcome, kind=kind)
+
+    def stats(self):
+        """Snapshot of counters: admitted, waited, coalesced, shed, timed_out, rate_limited."""
+        return self._tally.snapshot()
+
+    # ---- Admission ----
+
+    def _try_acquire(self, kind, tokens):
+        """Take capacity for one call and return 0, or return how long to wait. Caller holds _cond."""
+        now = time.monotonic()
+        priority = PRIORITY[kind]
+        if now < self._paused_until:
+            wait = self._paused_until - now
+        elif any(self._waiting[:priority]):
+            wait = POLL_SECONDS
+        else:
+            wait = max(
+                self.requests.wait_time(1, now) if self.requests else 0.0,
+                self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+            )
+        if kind in SHED and (wait or any(self._waiting) or self._below_reserve(tokens)):
+            self._count(kind, "shed")
+            raise SchedulerBusy("{} shed under load".format(kind))
+        if wait:
+            return wait
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        return 0.0
+
+    def _below_reserve(self, tokens):
+        return any(
+            bucket.headroom_after(amount) < self.suggestions_reserve
+            for bucket, amount in ((self.requests, 1), (self.tokens, tokens)) if bucket
+        )
+
+    def _backlog(self, priority):
+        """Rough seconds until the calls already queued at this priority or above have gone out."""
+        return sum(self._waiting[:priority + 1]) / self.requests.rate if self.requests else 0.0
+
+    def _deadline(self):
+        left = http_client.remaining()
+        return time.monotonic() + (min(self.max_wait, left) if left is not None else self.max_wait)
+
+    def _admitted(self, kind, started):
+        waited = time.monotonic() - started
+        self._count(kind, "waited" if waited > POLL_SECONDS else "admitted")
+        if waited > POLL_SECONDS:
+            metrics.observe_stage("llm_wait", waited)
+
+    def _timed_out(self, kind):
+        self._count(kind, "timed_out")
+        return SchedulerBusy("Too many children are practicing right now. Please try again in a moment.")
+
+    def acquire(self, kind, tokens):
+        """Block until a `kind` call of `tokens` estimated tokens may go out."""
+        started, deadline = time.monotonic(), self._deadline()
+        with self._cond:
+            wait = self._try_acquire(kind, tokens)
+            if not wait:
+                self._admitted(kind, started)
+                return
+            # Fail fast rather than queue for a slot that cannot come in time
+            if time.monotonic() + wait + self._backlog(PRIORITY[kind]) > deadline:
+                raise self._timed_out(kind)
+            self._waiting[PRIORITY[kind]] += 1
+            try:
+                while wait:
+                    if time.monotonic() + wait > deadline:
+                        raise self._timed_out(kind)
+                    self._cond.wait(wait)
+                    wait = self._try_acquire(kind, tokens)
+                self._admitted(kind, started)
+            finally:
+                self._waiting[PRIORITY[kind]] -= 1
+                self._cond.notify_all()
+
+    async def aacquire(self, kind, tokens):
+        """Coroutine version of acquire; waits on the event loop instead of blocking a thread."""
+        started, deadline = time.monotonic(), self._deadline()
+        with self._cond:
+            wait = self._try_acquire(kind, tokens)
+            if not wait:
+                self._admitted(kind, started)
+                return
+            if time.monotonic() + wait + self._backlog(PRIORITY[kind]) > deadline:
+                raise self._timed_out(kind)
+            self._waiting[PRIORITY[kind]] += 1
+        try:
+            while wait:
+                if time.monotonic() + wait > deadline:
+                    raise self._timed_out(kind)
+                await asyncio.sleep(wait)
+                with self._cond:
+                    wait = self._try_acquire(kind, tokens)
+            self._admitted(kind, started)
+        finally:
+            with self._cond:
+                self._waiting[PRIORITY[kind]] -= 1
+                self._cond.notify_all()
+
+    def _failed(self, e):
+        if _rate_limited(e):
+            self._count("any", "rate_limited")
+            with self._cond:
+                self._paused_until = max(self._paused_until, time.monotonic() + _retry_after(e))
+
+    # ---- Calls ----
+
+    @staticmethod
+    def _key(kind, messages):
+        raw = json.dumps([kind, messages], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def complete(self, provider, kind, messages):
+        """provider.complete(messages) once admitted; identical in-flight COALESCED calls share the result."""
+        key = self._key(kind, messages) if kind in COALESCED else None
+        if key is not None:
+            with self._cond:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+                else:
+                    self._count(kind, "coalesced")
+            if not leader:
+                return future.result()
+        try:
+            self.acquire(kind, estimate_tokens(kind, messages))
+            result = provider.complete(messages)
+        except Exception as e:
+            self._failed(e)
+            if key is not None:
+                future.set_exception(e)
+            raise
+        finally:
+            if key is not None:
+                with self._cond:
+                    self._inflight.pop(key, None)
+        if key is not None:
+            future.set_result(result)
+        return result
+
+    async def complete_async(self, provider, kind, messages):
+        key = self._key(kind, messages) if kind in COALESCED else None
+        if key is not None:
+            loop = asyncio.get_running_loop()
+            with self._cond:
+                future = self._inflight.get((loop, key))
+                leader = future is None
+                if leader:
+                    future = self._inflight[(loop, key)] = loop.create_future()
+                else:
+                    self._count(kind, "coalesced")
+            if not leader:
+                return await asyncio.shield(future)
+        try:
+            await self.aacquire(kind, estimate_tokens(kind, messages))
+            result = await provider.complete_async(messages)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self._failed(e)
+            if key is not None:
+                future.set_exception(e if isinstance(e, Exception) else SchedulerBusy("cancelled"))
+                future.exception()  # followers re-raise it; do not warn when there are none
+            raise
+        finally:
+            if key is not None:
+                with self._cond:
+                    self._inflight.pop((loop, key), None)
+        if key is not None:
+            future.set_result(result)
+        return result
+
+    def stream(self, provider, kind, messages):
+        """Yield provider.stream(messages) deltas once admitted (admission happens on the first next())."""
+        self.acquire(kind, estimate_tokens(kind, messages))
+        try:
+            yield from provider.stream(messages)
+        except Exception as e:
+            self._failed(e)
+            raise
+
+
+def from_env():
+    return LLMScheduler(
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+        tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+        burst_seconds=float(os.getenv("LLM_BURST_SECONDS", "60")),
+        max_wait=float(os.getenv("LLM_SCHEDULER_MAX_WAIT_SECONDS", "10")),
+        suggestions_reserve=float(os.getenv("LLM_SUGGESTIONS_RESERVE", "0.2")),
+    )
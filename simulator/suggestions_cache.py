@@ -0,0 +1,51 @@
+"""
+Cache of suggestion chips keyed on (scenario, normalized character reply).
+
+Character replies in a scenario repeat a lot ("Hi there! What can I help you find today?"),
+so the suggestions LLM call is skipped when the same reply has been seen before. Entries are
+filled in the background on a miss and can be precomputed with `manage.py precompute_suggestions`.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .vibe_cache import normalize
+
+
+def _count(result):
+    """Count a lookup as hit or miss (metrics.CACHE_LOOKUPS, cache="suggestions")."""
+    metrics.record_cache("suggestions", result)
+
+
+def _key(scenario, reply):
+    raw = "{}\x1f{}".format(normalize(scenario), normalize(reply))
+    return "suggestions:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _ttl():
+    return getattr(settings, "SUGGESTIONS_CACHE_TTL", 7 * 24 * 60 * 60)
+
+
+def lookup(scenario, reply):
+    """Return cached suggestions for this character reply, or None on a miss."""
+    suggestions = cache.get(_key(scenario, reply))
+    _count("hit" if suggestions else "miss")
+    return suggestions
+
+
+def store(scenario, reply, suggestions):
+    if suggestions:
+        cache.set(_key(scenario, reply), list(suggestions), _ttl())
+
+
+async def alookup(scenario, reply):
+    suggestions = await cache.aget(_key(scenario, reply))
+    _count("hit" if suggestions else "miss")
+    return suggestions
+
+
+async def astore(scenario, reply, suggestions):
+    if suggestions:
+        await cache.aset(_key(scenario, reply), list(suggestions), _ttl())
@@ -0,0 +1,93 @@
+"""
+Compact transcript storage: a whole practice session transcript in one compressed blob.
+
+With COMPACT_TRANSCRIPTS on, EndPracticeView stores the transcript on
+PracticeSession.transcript_blob instead of one PracticeSessionMessage row per line.
+The blob is zlib-compressed JSON of [sender, mood, text] triples where sender and mood are
+small integers (an unknown mood is kept as its string). PracticeSession.transcript decodes
+it lazily, and falls back to the message rows for sessions stored the old way.
+
+Migration 0006 carries its own frozen copy of the version 1 encoder; change FORMAT_VERSION
+(and keep decoding the old one) rather than the layout of version 1.
+"""
+import json
+import zlib
+from collections import Counter
+
+FORMAT_VERSION = 1
+SENDERS = ('user', 'assistant')
+MOODS = ('', 'HAPPY', 'SAD', 'ANGRY', 'NEUTRAL')
+MAX_TEXT_LENGTH = 4096
+
+
+def encode(messages):
+    """Compress a list of {sender, text, mood} dicts (already validated) into a blob."""
+    rows = []
+    for m in messages:
+        mood = m.get('mood') or ''
+        rows.append([
+            SENDERS.index(m['sender']),
+            MOODS.index(mood) if mood in MOODS else mood,
+            m.get('text') or '',
+        ])
+    payload = json.dumps([FORMAT_VERSION, rows], ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), 6)
+
+
+def decode(blob):
+    """The list of {sender, text, mood} dicts stored by encode(); mood is None when empty."""
+    version, rows = json.loads(zlib.decompress(bytes(blob)).decode('utf-8'))
+    if version != FORMAT_VERSION:
+        raise ValueError("Unknown transcript format version {}".format(version))
+    return [
+        {
+            "sender": SENDERS[sender],
+            "text": text,
+            "mood": (MOODS[mood] if isinstance(mood, int) else mood) or None,
+        }
+        for sender, mood, text in rows
+    ]
+
+
+def clean(messages):
+    """
+    Validate client- or server-supplied transcript entries: keep dicts from a known sender,
+    truncate text and mood. Returns (index, message) pairs so row storage can keep `order`.
+    """
+    cleaned = []
+    for i, m in enumerate(messages if isinstance(messages, list) else []):
+        if not isinstance(m, dict):
+            continue
+        sender = (m.get('sender') or 'user').lower()
+        if sender not in SENDERS:
+            continue
+        cleaned.append((i, {
+            "sender": sender,
+            "text": (m.get('text') or '')[:MAX_TEXT_LENGTH],
+            "mood": (m.get('mood') or '')[:16] if sender == 'assistant' else '',
+        }))
+    return cleaned
+
+
+def assistant_line_counts():
+    """
+    Counter of (scenario, text) for every character line in stored transcripts, whether the
+    session is kept as message rows or as a compact blob.
+    """
+    from django.db.models import Count
+    from .models import PracticeSession, PracticeSessionMessage
+
+    counts = Counter()
+    rows = (
+        PracticeSessionMessage.objects.filter(sender="assistant")
+        .values("session__scenario", "text")
+        .annotate(n=Count("id"))
+    )
+    for row in rows:
+        counts[(row["session__scenario"], row["text"])] += row["n"]
+    compact = PracticeSession.objects.filter(transcript_blob__isnull=False).values_list("scenario", "transcript_blob")
+    for scenario, blob in compact.iterator():
+        for m in decode(blob):
+            if m["sender"] == "assistant":
+                counts[(scenario, m["text"])] += 1
+    return counts
@@ -0,0 +1,212 @@
+"""
+ElevenLabs text-to-speech helpers and the on-disk audio cache used by TextToSpeechView.
+
+Cached clips are stored as <sha256>.mp3 files keyed by (voice_id, model_id, output_format, text).
+The cache is bounded by TTS_CACHE_MAX_BYTES; when it grows past that, the least recently
+used files (by mtime, which is bumped on every hit) are evicted.
+
+Upstream requests go through the shared outbound client (http_client). In streaming mode
+(TTS_STREAMING) a cache miss is relayed to the client chunk by chunk from the ElevenLabs
+streaming endpoint while being written to the cache, instead of buffering the whole MP3.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from . import http_client, metrics
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+DEFAULT_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"  # Rachel
+MODEL_ID = "eleven_multilingual_v2"
+OUTPUT_FORMAT = "mp3_44100_128"
+MAX_TEXT_LENGTH = 500
+
+
+def get_api_key():
+    return os.environ.get("ELEVENLABS_API_KEY", "").strip()
+
+
+def get_voice_id():
+    return os.environ.get("ELEVENLABS_VOICE_ID", DEFAULT_VOICE_ID).strip()
+
+
+def normalize_text(text):
+    """Same trimming the TTS endpoint applies, so warmed entries match live requests."""
+    return (text or "").strip()[:MAX_TEXT_LENGTH]
+
+
+CHUNK_SIZE = 8192
+
+
+def _open_speech(text, voice_id, api_key, stream, model_id=MODEL_ID, output_format=OUTPUT_FORMAT):
+    """POST to the TTS endpoint through the shared outbound client; returns a 2xx http_client.Response."""
+    path = "/v1/text-to-speech/{}{}?output_format={}".format(voice_id, "/stream" if stream else "", output_format)
+    payload = json.dumps({"text": text, "model_id": model_id}).encode("utf-8")
+    headers = {
+        "xi-api-key": api_key,
+        "Content-Type": "application/json",
+        "Accept": "audio/mpeg",
+    }
+    client = http_client.get_client(getattr(settings, "ELEVENLABS_BASE_URL", "https://api.elevenlabs.io"))
+    return client.request("POST", path, body=payload, headers=headers)
+
+
+def fetch_speech(text, voice_id, api_key, model_id=MODEL_ID, output_format=OUTPUT_FORMAT):
+    """Synthesize `text` with ElevenLabs and return the audio bytes. Raises HTTPError / URLError."""
+    return _open_speech(text, voice_id, api_key, False, model_id, output_format).read()
+
+
+def stream_speech(text, voice_id, api_key, model_id=MODEL_ID, output_format=OUTPUT_FORMAT):
+    """
+    Start a streaming synthesis and return an iterator of audio chunks.
+    Errors before the first byte (HTTP status, connection) raise HTTPError / URLError here.
+    """
+    return _open_speech(text, voice_id, api_key, True, model_id, output_format).iter_chunks(CHUNK_SIZE)
+
+
+class AudioCache:
+    """Content-addressed, size-bounded LRU cache of synthesized audio on local disk."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(voice_id, model_id, output_format, text):
+        raw = "\x1f".join((voice_id, model_id, output_format, text))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / (key + ".mp3")
+
+    def get(self, key):
+        """Return cached bytes (and mark the entry as recently used) or None."""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial clip
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def tee(self, key, chunks):
+        """
+        Yield `chunks` unchanged while writing them to the cache; the entry is only
+        committed if the stream completes and fits within max_bytes.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        f = os.fdopen(fd, "wb")
+        size = 0
+        complete = False
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if size <= self.max_bytes:
+                    f.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            f.close()
+            if hasattr(chunks, "close"):
+                chunks.close()
+            if complete and size <= self.max_bytes:
+                os.replace(tmp, self._path(key))
+                self.evict()
+            else:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.directory.glob("*.mp3"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = AudioCache(
+            getattr(settings, "TTS_CACHE_DIR", Path(settings.BASE_DIR) / "tts_cache"),
+            getattr(settings, "TTS_CACHE_MAX_BYTES", 200 * 1024 * 1024),
+        )
+    return _cache
+
+
+def cache_key(text, voice_id):
+    return AudioCache.key(voice_id, MODEL_ID, OUTPUT_FORMAT, text)
+
+
+def cached_speech(text, voice_id, api_key, stream=False):
+    """
+    Return (audio, hit) for `text`, synthesizing and caching on a miss.
+    `audio` is bytes, except for a miss with stream=True where it is an iterator
+    of chunks relayed from the upstream streaming endpoint.
+    """
+    cache = get_cache()
+    key = cache_key(text, voice_id)
+    data = cache.get(key)
+    metrics.record_cache("tts", "hit" if data is not None else "miss")
+    if data is not None:
+        return data, True
+    if stream:
+        return cache.tee(key, stream_speech(text, voice_id, api_key)), False
+    data = fetch_speech(text, voice_id, api_key)
+    cache.put(key, data)
+    return data, False
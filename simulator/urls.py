@@ -2,6 +2,7 @@ from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 from .views import (
     ChatInteractionView,
+    ChatStreamView,
     SignupView,
     AnalyticsView,
     ProfileView,
@@ -12,10 +13,13 @@ from .views import (
     SessionListView,
     SessionDetailView,
     TextToSpeechView,
+    chat_interaction_async,
 )
 
 urlpatterns = [
     path('chat/', ChatInteractionView.as_view(), name='chat_interaction'),
+    path('chat/stream/', ChatStreamView.as_view(), name='chat_stream'),
+    path('chat/async/', chat_interaction_async, name='chat_interaction_async'),
     path('signup/', SignupView.as_view(), name='signup'),
     path('login/', obtain_auth_token, name='login'),
     path('analytics/', AnalyticsView.as_view(), name='analytics'),
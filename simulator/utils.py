@@ -1,5 +1,9 @@
+import asyncio
+import contextvars
 import os
-from mistralai import Mistral
+from concurrent.futures import ThreadPoolExecutor
+
+from . import llm, metrics, scheduling, suggestions_cache, vibe_cache
 
 # Try to load from .env file if python-dotenv is installed
 try:
@@ -8,149 +12,481 @@ try:
 except ImportError:
     pass  # python-dotenv not installed, skip
 
-# Initialize Mistral client with API key from environment variable
-# Set MISTRAL_API_KEY environment variable or create a .env file
-api_key = os.getenv('MISTRAL_API_KEY', 'YOUR_MISTRAL_API_KEY')
-client = Mistral(api_key=api_key) if api_key != 'YOUR_MISTRAL_API_KEY' else None
+# LLM provider chosen by LLM_PROVIDER (see llm.py): Mistral by default, which needs
+# MISTRAL_API_KEY in the environment or a .env file; None when that key is missing
+provider = llm.from_env()
+# Every call to it is admitted by this scheduler: rate limits, priorities, coalescing (see scheduling.py)
+scheduler = scheduling.from_env()
+
+# Vibe check and roleplay run side by side on this pool; suggestion cache fills also
+# run here, in the background, so a slow suggestions call cannot hold the reply back.
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', '16'))
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix='llm')
+
+
+def _submit(fn, *args):
+    """Submit to the LLM pool, carrying the caller's context (e.g. the request deadline) into the worker."""
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def submit_background(fn, *args):
+    """Run work that is not needed for the current reply (e.g. summaries) on the LLM pool."""
+    return _submit(fn, *args)
+
+DEFAULT_SUGGESTIONS = ["Hi!", "Thank you", "Can you help me?", "Sorry"]
+MOOD_TAGS = ("[HAPPY]", "[SAD]", "[ANGRY]", "[NEUTRAL]")
+FLAGGED_FEEDBACK = "That might sound a bit mean. How about we try a different way?"
+
+VIBE_SYSTEM_PROMPT = (
+    "You are a filter for a child's social practice app. Reply ONLY with 'FLAG' or 'PASS'.\n\n"
+    "FLAG only if the message is: insults or name-calling, threats, swear words, "
+    "deliberately mean or cruel, or clearly inappropriate for a child (e.g. adult topics).\n\n"
+    "PASS for: mild frustration, annoyance, or disappointment; saying 'no' or 'I don't want to'; "
+    "complaining ('this is boring', 'I'm tired'); being shy or quiet; disagreement; "
+    "sadness or grumpiness; any normal negative emotion a child might express. "
+    "When in doubt, choose PASS."
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You keep a short memory of a roleplay between a child and a character in a social practice app. "
+    "Update the summary with the new lines. Keep what the character must remember: names, places, "
+    "what they are looking for or doing, and anything promised. Reply with the summary only, at most 80 words."
+)
+
+SUGGESTIONS_SYSTEM_PROMPT = (
+    "Reply with only 4 short phrases that directly respond to the character's last message. "
+    "One per line. No numbering. Stay on the same topic."
+)
+
+
+def roleplay_prompt(scenario):
+    return (
+        f"You are a friendly character in a {scenario}. Respond to the child as a real person would.\n\n"
+        "CRITICAL - CONTINUITY: You MUST continue the same conversation. Never reset or start over.\n"
+        "- If you offered to help (e.g. find their mom) and asked a question (e.g. 'Where did you last see her?'), "
+        "and the child answers (e.g. 'We were in the cereal aisle'), you MUST respond to that answer—e.g. "
+        "'Let's go check the cereal aisle together' or 'I'll help you look there.'\n"
+        "- NEVER reply with a new generic greeting like 'Oh, hey there! What can I help you with?' when you are "
+        "already in the middle of helping them. That would ignore what they just said.\n"
+        "- If the child gives you information you asked for (a place, a description, etc.), use it and continue "
+        "helping. Do not change the subject.\n\n"
+        "Your reaction must match what they said. Use exactly one tag at the end of your message:\n"
+        "- [HAPPY] ONLY when they do something clearly kind or thoughtful: saying please, thank you, "
+        "sorry, giving a compliment, offering to help, including others, or showing real appreciation. "
+        "Do NOT use [HAPPY] for a simple greeting like 'Hi', 'Hello', or 'Hey' by itself—use [NEUTRAL] for those.\n"
+        "- [SAD] if they are rude, dismissive, or say something that hurts your feelings—show that you're hurt.\n"
+        "- [ANGRY] if they are mean, insulting, or deliberately unkind—show that you're upset.\n"
+        "- [NEUTRAL] for bland small talk, simple greetings, or when you're not sure.\n\n"
+        "If the child is rude or mean, do NOT stay neutral. React with [SAD] or [ANGRY]. "
+        "Reserve [HAPPY] for genuine kindness—polite words, appreciation, or caring—not just saying hi."
+    )
+
+
+def suggestions_prompt(scenario, clean_text):
+    return (
+        f"Scenario: {scenario}. The character just said: \"{clean_text[:300]}\"\n\n"
+        "Suggest exactly 4 short phrases a child might say NEXT in direct response to what the character JUST said. "
+        "Rules: Each suggestion must stay ON TOPIC with the character's message. "
+        "If the character said they love gummy bears, suggest things about gummy bears or agreeing (e.g. 'I love gummy bears too!', 'What's your favorite flavor?')—do NOT suggest unrelated things like cookies or other topics. "
+        "If the character is helping the child find someone or something, suggest things that continue that (e.g. 'She was wearing a red shirt', 'Let's look over there'). "
+        "One phrase per line, no numbers or bullets. Keep each under 10 words. Only in-context replies."
+    )
+
+
+def vibe_messages(user_text):
+    return [
+        {"role": "system", "content": VIBE_SYSTEM_PROMPT},
+        {"role": "user", "content": user_text},
+    ]
+
+
+def roleplay_messages(user_text, scenario, history, summary=None):
+    """
+    Build messages with the conversation history so the model remembers context.
+    `summary` covers earlier turns that are no longer sent verbatim.
+    """
+    system = roleplay_prompt(scenario)
+    if summary:
+        system += "\n\nEarlier in this conversation (summary): " + summary
+    messages = [{"role": "system", "content": system}]
+    for h in history:
+        role = "user" if h.get("sender") == "user" else "assistant"
+        text = (h.get("text") or "").strip()
+        if text:
+            messages.append({"role": role, "content": text})
+    # When there is history, prepend a short reminder so the model treats the next line as the child's direct reply
+    if history:
+        context_nudge = (
+            "[The child is replying to what you last said. Respond by continuing that conversation—do not start a new one.]\n\n"
+            "Child says: "
+        )
+        messages.append({"role": "user", "content": context_nudge + user_text})
+    else:
+        messages.append({"role": "user", "content": user_text})
+    return messages
+
+
+def suggestions_messages(scenario, clean_text):
+    return [
+        {"role": "system", "content": SUGGESTIONS_SYSTEM_PROMPT},
+        {"role": "user", "content": suggestions_prompt(scenario, clean_text)},
+    ]
+
+
+def summary_messages(previous, turns):
+    lines = "\n".join(
+        "{}: {}".format("Child" if sender == "user" else "Character", text) for sender, text, _ in turns
+    )
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": "Summary so far: {}\n\nNew lines:\n{}".format(previous or "(none)", lines)},
+    ]
+
+
+def is_flagged(vibe_text):
+    return "FLAG" in (vibe_text or "").strip().upper()
+
+
+def parse_mood(content):
+    """Extract Mood for the Visual-First interface and strip the tags. Returns (clean_text, mood)."""
+    mood = "NEUTRAL"
+    if "[HAPPY]" in content:
+        mood = "HAPPY"
+    elif "[ANGRY]" in content:
+        mood = "ANGRY"
+    elif "[SAD]" in content:
+        mood = "SAD"
+    clean_text = content
+    for tag in MOOD_TAGS:
+        clean_text = clean_text.replace(tag, "")
+    return clean_text.strip(), mood
+
+
+def parse_suggestions(raw):
+    suggestions = [line.strip() for line in (raw or "").strip().split("\n") if line.strip()][:5]
+    return [s.lstrip(".-)0123456789 ") for s in suggestions]  # drop leading numbers/bullets
+
+
+class MoodTagStripper:
+    """
+    Removes [HAPPY]/[SAD]/[ANGRY]/[NEUTRAL] tags from a reply as it streams in.
+    A trailing partial tag (e.g. "[HAP") and trailing whitespace are held back
+    until the next chunk shows what they are, so clients never see tag fragments.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.tags = set()
+        self.started = False
 
-def analyze_interaction(user_text, scenario, history=None):
+    def feed(self, chunk):
+        text = self.pending + chunk
+        for tag in MOOD_TAGS:
+            if tag in text:
+                self.tags.add(tag)
+                text = text.replace(tag, "")
+        hold = ""
+        cut = text.rfind("[")
+        if cut != -1 and any(tag.startswith(text[cut:]) for tag in MOOD_TAGS):
+            text, hold = text[:cut], text[cut:]
+        visible = text.rstrip()
+        self.pending = text[len(visible):] + hold
+        if not self.started:
+            visible = visible.lstrip()
+            self.started = bool(visible)
+        return visible
+
+    def finish(self):
+        """Returns (remaining_text, mood) once the stream has ended."""
+        tail = self.pending.rstrip()
+        if not self.started:
+            tail = tail.lstrip()
+        self.pending = ""
+        mood = "NEUTRAL"
+        for tag, name in (("[HAPPY]", "HAPPY"), ("[ANGRY]", "ANGRY"), ("[SAD]", "SAD")):
+            if tag in self.tags:
+                mood = name
+                break
+        return tail, mood
+
+
+def _complete(messages, kind):
+    return scheduler.complete(provider, kind, messages)
+
+
+async def _complete_async(messages, kind):
+    return await scheduler.complete_async(provider, kind, messages)
+
+
+def _stream_deltas(messages):
+    """Yield text deltas from a streamed roleplay completion."""
+    return scheduler.stream(provider, scheduling.ROLEPLAY, messages)
+
+
+def _vibe_check(user_text):
+    """Ask the filter LLM for a verdict and remember it for repeats of the same message."""
+    with metrics.stage("vibe_check"):
+        raw = _complete(vibe_messages(user_text), scheduling.VIBE_CHECK)
+        verdict = vibe_cache.FLAG if is_flagged(raw) else vibe_cache.PASS
+    vibe_cache.store(user_text, verdict)
+    return verdict
+
+
+async def _vibe_check_async(user_text):
+    with metrics.stage("vibe_check"):
+        raw = await _complete_async(vibe_messages(user_text), scheduling.VIBE_CHECK)
+        verdict = vibe_cache.FLAG if is_flagged(raw) else vibe_cache.PASS
+    await vibe_cache.astore(user_text, verdict)
+    return verdict
+
+
+def fill_suggestions(scenario, clean_text):
+    """
+    Generate suggestions for a character reply and cache them for the next time it comes up.
+    Returns them, or [] if the call failed (used by precompute_suggestions too).
+    """
+    try:
+        with metrics.stage("suggestions"):
+            raw = _complete(suggestions_messages(scenario, clean_text), scheduling.SUGGESTIONS)
+            suggestions = parse_suggestions(raw)
+    except Exception:
+        return []
+    suggestions_cache.store(scenario, clean_text, suggestions)
+    return suggestions
+
+
+async def fill_suggestions_async(scenario, clean_text):
+    try:
+        with metrics.stage("suggestions"):
+            raw = await _complete_async(suggestions_messages(scenario, clean_text), scheduling.SUGGESTIONS)
+            suggestions = parse_suggestions(raw)
+    except Exception:
+        return []
+    await suggestions_cache.astore(scenario, clean_text, suggestions)
+    return suggestions
+
+
+def summarize_turns(previous, turns):
+    """Fold `turns` ([sender, text, mood] lists) into the rolling summary `previous`; returns the new summary."""
+    if provider is None:
+        return ""
+    with metrics.stage("summary"):
+        return _complete(summary_messages(previous, turns), scheduling.SUMMARY)
+
+
+def _roleplay(messages):
+    with metrics.stage("roleplay"):
+        return _complete(messages, scheduling.ROLEPLAY)
+
+
+async def _roleplay_async(messages):
+    with metrics.stage("roleplay"):
+        return await _complete_async(messages, scheduling.ROLEPLAY)
+
+
+# Keeps background suggestion fills alive after the turn that started them has returned
+_background_tasks = set()
+
+
+def analyze_interaction(user_text, scenario, history=None, summary=None):
     """
     Handles the 'Social Practice Gap' by checking for tone
     before generating a response. Uses conversation history so the agent
     remembers context (e.g. helping find mom, last seen near produce).
-    Uses Mistral AI API.
+    Uses the configured LLM provider (Mistral AI API by default, see llm.py).
+
+    The vibe check and the roleplay reply are requested at the same time; if
+    the message is flagged the reply is simply discarded. Suggestions come from
+    the cache; on a miss the default chips are returned right away and the cache
+    is filled in the background for the next time the reply comes up.
     """
     history = history or []
 
     # Check if API key is configured
-    if client is None or api_key == 'YOUR_MISTRAL_API_KEY':
+    if provider is None:
         return {
             "status": "error",
             "reply": "⚠️ Mistral API key not configured. Please set the MISTRAL_API_KEY environment variable.",
             "mood": "NEUTRAL"
         }
-    
+
     try:
-        # 1. PRE-SEND VIBE CHECK (Preventative) [cite: 40, 150]
-        vibe_system_prompt = (
-            "You are a filter for a child's social practice app. Reply ONLY with 'FLAG' or 'PASS'.\n\n"
-            "FLAG only if the message is: insults or name-calling, threats, swear words, "
-            "deliberately mean or cruel, or clearly inappropriate for a child (e.g. adult topics).\n\n"
-            "PASS for: mild frustration, annoyance, or disappointment; saying 'no' or 'I don't want to'; "
-            "complaining ('this is boring', 'I'm tired'); being shy or quiet; disagreement; "
-            "sadness or grumpiness; any normal negative emotion a child might express. "
-            "When in doubt, choose PASS."
-        )
-        
-        vibe_response = client.chat.complete(
-            model="mistral-small-latest",
-            messages=[
-                {"role": "system", "content": vibe_system_prompt},
-                {"role": "user", "content": user_text}
-            ]
-        )
+        # 1. PRE-SEND VIBE CHECK (Preventative) [cite: 40, 150]: known verdicts skip the filter call,
+        # otherwise it runs speculatively alongside
+        # 2. ADAPTIVE ROLEPLAY with conversation history so the agent remembers context
+        verdict = vibe_cache.lookup(user_text)
+        if verdict == vibe_cache.FLAG:
+            return {
+                "status": "flagged",
+                "feedback": FLAGGED_FEEDBACK,
+                "suggestions": []
+            }
+        vibe_future = None if verdict else _submit(_vibe_check, user_text)
+        reply_future = _submit(_roleplay, roleplay_messages(user_text, scenario, history, summary))
+
+        if vibe_future is not None and is_flagged(vibe_future.result()):
+            reply_future.cancel()
+            return {
+                "status": "flagged",
+                "feedback": FLAGGED_FEEDBACK,
+                "suggestions": []
+            }
+
+        clean_text, mood = parse_mood(reply_future.result())
+
+        # 3. SUGGESTED RESPONSES: must directly respond to what the character just said.
+        # Repeated replies are served from the cache; a miss is filled in the background
+        # without holding up this turn, which gets the default chips.
+        suggestions = suggestions_cache.lookup(scenario, clean_text)
+        if suggestions is None:
+            submit_background(fill_suggestions, scenario, clean_text)
+
+        return {
+            "status": "success",
+            "reply": clean_text,
+            "mood": mood,
+            "suggestions": suggestions if suggestions else list(DEFAULT_SUGGESTIONS)
+        }
+
+    except Exception as e:
+        # Return error message instead of crashing
+        return {
+            "status": "error",
+            "reply": f"⚠️ Error: {str(e)}",
+            "mood": "NEUTRAL",
+            "suggestions": []
+        }
+
+
+async def analyze_interaction_async(user_text, scenario, history=None, summary=None):
+    """
+    Coroutine version of analyze_interaction for the ASGI chat endpoint.
+    Uses the provider's async calls so no thread is held while requests are in flight.
+    """
+    history = history or []
 
-        vibe_text = (vibe_response.choices[0].message.content or "").strip().upper()
+    if provider is None:
+        return {
+            "status": "error",
+            "reply": "⚠️ Mistral API key not configured. Please set the MISTRAL_API_KEY environment variable.",
+            "mood": "NEUTRAL"
+        }
 
-        if "FLAG" in vibe_text:
+    reply_task = None
+    try:
+        verdict = await vibe_cache.alookup(user_text)
+        if verdict == vibe_cache.FLAG:
             return {
                 "status": "flagged",
-                "feedback": "That might sound a bit mean. How about we try a different way?",
+                "feedback": FLAGGED_FEEDBACK,
                 "suggestions": []
             }
+        vibe_task = None if verdict else asyncio.ensure_future(_vibe_check_async(user_text))
+        reply_task = asyncio.ensure_future(_roleplay_async(roleplay_messages(user_text, scenario, history, summary)))
 
-        # 2. ADAPTIVE ROLEPLAY with conversation history so the agent remembers context
-        roleplay_prompt = (
-            f"You are a friendly character in a {scenario}. Respond to the child as a real person would.\n\n"
-            "CRITICAL - CONTINUITY: You MUST continue the same conversation. Never reset or start over.\n"
-            "- If you offered to help (e.g. find their mom) and asked a question (e.g. 'Where did you last see her?'), "
-            "and the child answers (e.g. 'We were in the cereal aisle'), you MUST respond to that answer—e.g. "
-            "'Let's go check the cereal aisle together' or 'I'll help you look there.'\n"
-            "- NEVER reply with a new generic greeting like 'Oh, hey there! What can I help you with?' when you are "
-            "already in the middle of helping them. That would ignore what they just said.\n"
-            "- If the child gives you information you asked for (a place, a description, etc.), use it and continue "
-            "helping. Do not change the subject.\n\n"
-            "Your reaction must match what they said. Use exactly one tag at the end of your message:\n"
-            "- [HAPPY] ONLY when they do something clearly kind or thoughtful: saying please, thank you, "
-            "sorry, giving a compliment, offering to help, including others, or showing real appreciation. "
-            "Do NOT use [HAPPY] for a simple greeting like 'Hi', 'Hello', or 'Hey' by itself—use [NEUTRAL] for those.\n"
-            "- [SAD] if they are rude, dismissive, or say something that hurts your feelings—show that you're hurt.\n"
-            "- [ANGRY] if they are mean, insulting, or deliberately unkind—show that you're upset.\n"
-            "- [NEUTRAL] for bland small talk, simple greetings, or when you're not sure.\n\n"
-            "If the child is rude or mean, do NOT stay neutral. React with [SAD] or [ANGRY]. "
-            "Reserve [HAPPY] for genuine kindness—polite words, appreciation, or caring—not just saying hi."
-        )
+        if vibe_task is not None and is_flagged(await vibe_task):
+            reply_task.cancel()
+            return {
+                "status": "flagged",
+                "feedback": FLAGGED_FEEDBACK,
+                "suggestions": []
+            }
 
-        # Build messages with full conversation history so the model remembers context
-        roleplay_messages = [{"role": "system", "content": roleplay_prompt}]
-        for h in history:
-            role = "user" if h.get("sender") == "user" else "assistant"
-            text = (h.get("text") or "").strip()
-            if text:
-                roleplay_messages.append({"role": role, "content": text})
-        # When there is history, prepend a short reminder so the model treats the next line as the child's direct reply
-        if history:
-            context_nudge = (
-                "[The child is replying to what you last said. Respond by continuing that conversation—do not start a new one.]\n\n"
-                "Child says: "
-            )
-            roleplay_messages.append({"role": "user", "content": context_nudge + user_text})
-        else:
-            roleplay_messages.append({"role": "user", "content": user_text})
-
-        ai_reply = client.chat.complete(
-            model="mistral-small-latest",
-            messages=roleplay_messages
-        )
+        clean_text, mood = parse_mood(await reply_task)
 
-        content = (ai_reply.choices[0].message.content or "").strip()
-        
-        # Extract Mood for the Visual-First interface [cite: 148]
-        mood = "NEUTRAL"
-        if "[HAPPY]" in content:
-            mood = "HAPPY"
-        elif "[ANGRY]" in content:
-            mood = "ANGRY"
-        elif "[SAD]" in content:
-            mood = "SAD"
-        
-        clean_text = content.replace("[HAPPY]", "").replace("[SAD]", "").replace("[ANGRY]", "").replace("[NEUTRAL]", "").strip()
-
-        # 3. SUGGESTED RESPONSES: must directly respond to what the character just said
-        suggestions_prompt = (
-            f"Scenario: {scenario}. The character just said: \"{clean_text[:300]}\"\n\n"
-            "Suggest exactly 4 short phrases a child might say NEXT in direct response to what the character JUST said. "
-            "Rules: Each suggestion must stay ON TOPIC with the character's message. "
-            "If the character said they love gummy bears, suggest things about gummy bears or agreeing (e.g. 'I love gummy bears too!', 'What's your favorite flavor?')—do NOT suggest unrelated things like cookies or other topics. "
-            "If the character is helping the child find someone or something, suggest things that continue that (e.g. 'She was wearing a red shirt', 'Let's look over there'). "
-            "One phrase per line, no numbers or bullets. Keep each under 10 words. Only in-context replies."
-        )
-        try:
-            sugg_response = client.chat.complete(
-                model="mistral-small-latest",
-                messages=[
-                    {"role": "system", "content": "Reply with only 4 short phrases that directly respond to the character's last message. One per line. No numbering. Stay on the same topic."},
-                    {"role": "user", "content": suggestions_prompt}
-                ]
-            )
-            raw = (sugg_response.choices[0].message.content or "").strip()
-            suggestions = [line.strip() for line in raw.split("\n") if line.strip()][:5]
-            suggestions = [s.lstrip(".-)0123456789 ") for s in suggestions]  # drop leading numbers/bullets
-        except Exception:
-            suggestions = []
+        suggestions = await suggestions_cache.alookup(scenario, clean_text)
+        if suggestions is None:
+            fill = asyncio.ensure_future(fill_suggestions_async(scenario, clean_text))
+            _background_tasks.add(fill)
+            fill.add_done_callback(_background_tasks.discard)
 
         return {
             "status": "success",
             "reply": clean_text,
             "mood": mood,
-            "suggestions": suggestions if suggestions else ["Hi!", "Thank you", "Can you help me?", "Sorry"]
+            "suggestions": suggestions if suggestions else list(DEFAULT_SUGGESTIONS)
         }
-    
+
     except Exception as e:
-        # Return error message instead of crashing
+        if reply_task is not None:
+            reply_task.cancel()
         return {
             "status": "error",
             "reply": f"⚠️ Error: {str(e)}",
             "mood": "NEUTRAL",
             "suggestions": []
         }
+
+
+def stream_interaction(user_text, scenario, history=None, summary=None):
+    """
+    Streaming version of analyze_interaction. Yields (event, data) pairs:
+    'token' chunks of the reply, then 'mood' with the full reply, then
+    'suggestions'. A flagged message yields a single 'flagged' event and an
+    unconfigured provider or failure yields 'error' (same payloads as the JSON endpoint).
+
+    The vibe check runs alongside the roleplay stream; tokens are buffered
+    until it passes, so nothing is shown for a message that gets flagged.
+    """
+    history = history or []
+
+    if provider is None:
+        yield "error", {
+            "status": "error",
+            "reply": "⚠️ Mistral API key not configured. Please set the MISTRAL_API_KEY environment variable.",
+            "mood": "NEUTRAL"
+        }
+        return
+
+    flagged = {"status": "flagged", "feedback": FLAGGED_FEEDBACK, "suggestions": []}
+    try:
+        verdict = vibe_cache.lookup(user_text)
+        if verdict == vibe_cache.FLAG:
+            yield "flagged", flagged
+            return
+        cleared = verdict == vibe_cache.PASS
+        vibe_future = None if cleared else _submit(_vibe_check, user_text)
+        stripper = MoodTagStripper()
+        buffered, reply_parts = [], []
+        deltas = _stream_deltas(roleplay_messages(user_text, scenario, history, summary))
+        for delta in metrics.timed_iter("roleplay", deltas):
+            text = stripper.feed(delta)
+            if text:
+                buffered.append(text)
+            if not cleared and vibe_future.done():
+                if is_flagged(vibe_future.result()):
+                    yield "flagged", flagged
+                    return
+                cleared = True
+            if cleared and buffered:
+                for text in buffered:
+                    yield "token", {"text": text}
+                reply_parts.extend(buffered)
+                buffered = []
+
+        if not cleared and is_flagged(vibe_future.result()):
+            yield "flagged", flagged
+            return
+
+        tail, mood = stripper.finish()
+        if tail:
+            buffered.append(tail)
+        for text in buffered:
+            yield "token", {"text": text}
+        reply_parts.extend(buffered)
+        reply = "".join(reply_parts)
+    except Exception as e:
+        yield "error", {
+            "status": "error",
+            "reply": f"⚠️ Error: {str(e)}",
+            "mood": "NEUTRAL",
+            "suggestions": []
+        }
+        return
+
+    yield "mood", {"status": "success", "reply": reply, "mood": mood}
+    # The reply is already on screen, so suggestions can take their time
+    suggestions = suggestions_cache.lookup(scenario, reply)
+    if suggestions is None:
+        suggestions = fill_suggestions(scenario, reply)
+    yield "suggestions", {"suggestions": suggestions if suggestions else list(DEFAULT_SUGGESTIONS)}
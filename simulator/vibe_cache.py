@@ -0,0 +1,94 @@
+"""
+Cache of vibe-check (FLAG/PASS) verdicts, so repeated messages skip the filter LLM call.
+
+Messages are normalized (case, whitespace, surrounding punctuation) so "Thank you!" and
+"thank you" share an entry. Verdicts are stored in the Django cache for VIBE_CACHE_TTL
+seconds. Before the cache, a compiled word list flags obvious profanity locally.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+FLAG = "FLAG"
+PASS = "PASS"
+
+# Obvious profanity only; anything subtler (insults, tone) is left to the LLM filter.
+# Each entry is a whole word with its inflections spelled out: an open suffix like
+# `sh[i1]+t+\w*` also matches "shiitake", and a false FLAG blocks an ordinary message.
+BLOCKED_WORDS = (
+    r"f+u+c+k+(?:s|ed|er|ers|in|ing)?",
+    r"motherf+u+c+k+(?:er|ers|in|ing)?",
+    r"(?:bull)?sh[i1]+t+(?:s|ty|tier|tiest|ted|ting|head|heads)?",
+    r"b[i1]tch(?:es|ed|ing|y)?",
+    r"bastards?",
+    r"a+ss+holes?",
+    r"c+u+n+t+s?",
+    r"wh[o0]res?",
+    r"sluts?",
+    r"wank(?:s|ed|er|ers|ing)?",
+    r"twats?",
+)
+
+_blocklist = None
+
+
+def _count(result):
+    """Count a lookup as local_flag, hit or miss (metrics.CACHE_LOOKUPS, cache="vibe")."""
+    metrics.record_cache("vibe", result)
+
+
+def normalize(text):
+    text = " ".join((text or "").casefold().split())
+    return text.strip(" .,!?;:'\"()-")
+
+
+def _key(normalized):
+    return "vibe:" + hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def _ttl():
+    return getattr(settings, "VIBE_CACHE_TTL", 24 * 60 * 60)
+
+
+def blocklist():
+    global _blocklist
+    if _blocklist is None:
+        words = list(BLOCKED_WORDS) + [re.escape(w) for w in getattr(settings, "VIBE_EXTRA_BLOCKED_WORDS", ())]
+        _blocklist = re.compile(r"\b(?:{})\b".format("|".join(words)), re.IGNORECASE)
+    return _blocklist
+
+
+def local_verdict(text):
+    """FLAG for obvious profanity, otherwise None (unknown)."""
+    return FLAG if blocklist().search(text or "") else None
+
+
+def lookup(text):
+    """Return a known verdict for `text` (local word list, then cache), or None on a miss."""
+    if local_verdict(text):
+        _count("local_flag")
+        return FLAG
+    verdict = cache.get(_key(normalize(text)))
+    _count("hit" if verdict else "miss")
+    return verdict
+
+
+def store(text, verdict):
+    cache.set(_key(normalize(text)), verdict, _ttl())
+
+
+async def alookup(text):
+    if local_verdict(text):
+        _count("local_flag")
+        return FLAG
+    verdict = await cache.aget(_key(normalize(text)))
+    _count("hit" if verdict else "miss")
+    return verdict
+
+
+async def astore(text, verdict):
+    await cache.aset(_key(normalize(text)), verdict, _ttl())
@@ -1,21 +1,32 @@
+import base64
+import binascii
+import hmac
 import json
-import os
-from urllib.request import Request, urlopen
 from urllib.error import HTTPError, URLError
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q, Sum
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time as dt_time, timedelta
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from . import coins, context, conversations, daily_stats, log_writer, metrics, profile_cache, transcripts, tts
+from .authentication import CachedTokenAuthentication
 from .serializers import UserSerializer
-from .utils import analyze_interaction
-from .models import InteractionLog, UserProfile, PracticeSession, PracticeSessionMessage
+from .utils import analyze_interaction, analyze_interaction_async, stream_interaction
+from .models import InteractionLog, UserDailyStats, PracticeSession, PracticeSessionMessage
 
 try:
     from dotenv import load_dotenv
@@ -31,6 +42,12 @@ REWARDS = [
     {"id": "certificate", "name": "Certificate of Kindness", "cost": 100, "description": "Print a certificate!"},
     {"id": "confetti", "name": "Confetti Effect", "cost": 40, "description": "Celebrate with confetti when you reach a goal."},
 ]
+REWARDS_BY_ID = {r["id"]: r for r in REWARDS}
+# Each reward serialized once, as (not owned, owned); ShopView only joins the pieces
+SHOP_ITEMS_JSON = [
+    (r["id"], tuple(json.dumps({**r, "owned": owned}, separators=(',', ':')) for owned in (False, True)))
+    for r in REWARDS
+]
 
 
 class SignupView(generics.CreateAPIView):
@@ -42,219 +59,414 @@ class SignupView(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
 
+def log_interaction(user, scenario, result):
+    """
+    Log one chat outcome for analytics (flagged, or the reply mood) and update the daily rollup.
+    With INTERACTION_LOG_BUFFERED the row is queued and written in a batch off the request path.
+    """
+    if result.get('status') == 'flagged':
+        mood, flagged = '', True
+    elif result.get('status') in ('success', 'error'):
+        mood, flagged = result.get('mood', 'NEUTRAL'), False
+    else:
+        return
+    with metrics.stage('db_log'):
+        if getattr(settings, 'INTERACTION_LOG_BUFFERED', False):
+            log_writer.get_writer().submit(user.pk, scenario, mood, flagged)
+            return
+        with transaction.atomic():
+            log = InteractionLog.objects.create(user=user, scenario=scenario, mood=mood, flagged=flagged)
+            daily_stats.record(log)
+
+
+def chat_history(user, data, scenario):
+    """
+    Resolve the server-held conversation for a chat turn and return (conversation, history, summary),
+    with history fitted to the prompt token budget (see context.build).
+    Clients send `conversation_id`; a client-sent `history` is ignored, so no one can put words
+    in the character's mouth.
+    """
+    conversation = conversations.get_or_create(data.get('conversation_id'), user, scenario)
+    history, summary = context.build(conversation)
+    return conversation, history, summary
+
+
+def record_turn(conversation, user_text, result):
+    """Append a successful exchange to the conversation (flagged messages are not part of it)."""
+    if result.get('status') == 'success':
+        conversations.append(conversation, user_text, result.get('reply', ''), result.get('mood', 'NEUTRAL'))
+
+
 class ChatInteractionView(APIView):
     """
     Endpoint for the 'Interactive Social Roleplay Platform'.
     Handles Vibe Check, Adaptive AI responses, and Mood shifts.
     Requires Token authentication so the backend knows who is chatting.
+    The conversation is held server-side; responses carry its `conversation_id`.
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         user_text = request.data.get('message')
         scenario = request.data.get('scenario', 'Grocery Store')
-        history = request.data.get('history')  # list of { sender: 'user'|'assistant', text: '...' }
 
         if not user_text:
             return Response({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not isinstance(history, list):
-            history = []
-        # Keep last N turns to avoid huge context (e.g. last 10 messages = 5 exchanges)
-        max_history = 12
-        history = history[-max_history:]
+        conversation, history, summary = chat_history(request.user, request.data, scenario)
+        result = analyze_interaction(user_text, scenario, history=history, summary=summary)
+        record_turn(conversation, user_text, result)
+        log_interaction(request.user, scenario, result)
+        return Response({**result, "conversation_id": conversation["id"]}, status=status.HTTP_200_OK)
+
+
+def _sse(event, data):
+    return "event: {}\ndata: {}\n\n".format(event, json.dumps(data))
+
 
-        result = analyze_interaction(user_text, scenario, history=history)
+def _is_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
 
-        # Log for analytics
-        if result.get('status') == 'flagged':
-            InteractionLog.objects.create(
-                user=request.user, scenario=scenario, mood='', flagged=True
-            )
-        elif result.get('status') in ('success', 'error'):
-            InteractionLog.objects.create(
-                user=request.user,
-                scenario=scenario,
-                mood=result.get('mood', 'NEUTRAL'),
-                flagged=False,
-            )
 
-        return Response(result, status=status.HTTP_200_OK)
+async def _iterate_in_thread(iterator):
+    """
+    Async iterator over a blocking one, producing each item on a worker thread. Under ASGI,
+    StreamingHttpResponse collects a sync iterator into a list before sending anything, so
+    streamed views hand it this instead.
+    """
+    done = object()
+    step = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            item = await step(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=False)()
+
+
+class ChatStreamView(APIView):
+    """
+    Streaming variant of ChatInteractionView (server-sent events).
+    Starts with a 'conversation' event carrying the conversation id, then sends 'token'
+    events as the reply is generated, then 'mood', then 'suggestions'; or a single
+    'flagged' / 'error' event with the same payload as /api/chat/.
+    Under ASGI the events come from an async iterator, so each is sent as soon as it is ready.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user_text = request.data.get('message')
+        scenario = request.data.get('scenario', 'Grocery Store')
+
+        if not user_text:
+            return Response({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        conversation, history, summary = chat_history(user, request.data, scenario)
+
+        def record(data):
+            record_turn(conversation, user_text, data)
+            log_interaction(user, scenario, data)
+
+        def events():
+            yield _sse('conversation', {"conversation_id": conversation["id"]})
+            for event, data in stream_interaction(user_text, scenario, history=history, summary=summary):
+                if event in ('mood', 'flagged', 'error'):
+                    record(data)
+                yield _sse(event, data)
+
+        async def events_async():
+            # The LLM stream is drained on a worker thread; database writes go through sync_to_async
+            yield _sse('conversation', {"conversation_id": conversation["id"]})
+            stream = stream_interaction(user_text, scenario, history=history, summary=summary)
+            async for event, data in _iterate_in_thread(stream):
+                if event in ('mood', 'flagged', 'error'):
+                    await sync_to_async(record)(data)
+                yield _sse(event, data)
+
+        response = StreamingHttpResponse(events_async() if _is_asgi(request) else events(),
+                                         content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+        return response
+
+
+async def _authenticate_token(request):
+    """Run DRF token authentication for a plain (non-DRF) async view. Returns the user or None."""
+    try:
+        auth = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return auth[0] if auth else None
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint (metrics.render). The scraper sends METRICS_TOKEN as
+    `Authorization: Bearer <token>`; with no token configured the endpoint is only open
+    when DEBUG is on, and refused otherwise.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    else:
+        sent = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(sent.encode(), 'Bearer {}'.format(token).encode()):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@csrf_exempt
+@require_POST
+async def chat_interaction_async(request):
+    """
+    Async variant of ChatInteractionView for ASGI deployments (sociable_backend.asgi).
+    Same request/response shape as /api/chat/, but the LLM calls are awaited on the
+    event loop instead of holding a worker thread for the whole turn.
+    """
+    user = await _authenticate_token(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(data, dict):
+        data = {}
+
+    user_text = data.get('message')
+    scenario = data.get('scenario', 'Grocery Store')
+
+    if not user_text:
+        return JsonResponse({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    conversation, history, summary = await sync_to_async(chat_history)(user, data, scenario)
+    result = await analyze_interaction_async(user_text, scenario, history=history, summary=summary)
+    await sync_to_async(record_turn)(conversation, user_text, result)
+    await sync_to_async(log_interaction)(user, scenario, result)
+    return JsonResponse({**result, "conversation_id": conversation["id"]}, status=status.HTTP_200_OK)
 
 
 class AnalyticsView(APIView):
     """
     Returns analytics for the authenticated user: totals, by scenario, by mood, last 7 days.
+    Read from the UserDailyStats rollups, so the cost grows with days used, not interactions.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        logs = InteractionLog.objects.filter(user=user)
+        stats = UserDailyStats.objects.filter(user=request.user)
 
-        total = logs.count()
+        totals = (
+            stats.order_by()
+            .values('scenario')
+            .annotate(**{c: Sum(c) for c in daily_stats.COUNTERS})
+        )
         by_scenario = {}
-        by_mood = {}
-        flagged_count = 0
-        for log in logs:
-            by_scenario[log.scenario] = by_scenario.get(log.scenario, 0) + 1
-            if log.flagged:
-                flagged_count += 1
-            else:
-                m = log.mood or 'NEUTRAL'
-                by_mood[m] = by_mood.get(m, 0) + 1
-
-        since = timezone.now() - timedelta(days=7)
-        last_7 = logs.filter(created_at__gte=since)
-        by_day = {}
-        for log in last_7:
-            day = log.created_at.date().isoformat()
-            by_day[day] = by_day.get(day, 0) + 1
-        last_7_days = [{"date": d, "count": c} for d, c in sorted(by_day.items())]
+        counts = dict.fromkeys(daily_stats.COUNTERS, 0)
+        for row in totals:
+            by_scenario[row['scenario']] = row['total']
+            for c in daily_stats.COUNTERS:
+                counts[c] += row[c]
+        by_mood = {
+            mood: counts[field] for mood, field in daily_stats.MOOD_COUNTERS.items() if counts[field]
+        }
+
+        since = timezone.localdate() - timedelta(days=7)
+        days = stats.filter(date__gte=since).order_by('date').values('date').annotate(n=Sum('total'))
+        last_7_days = [{"date": d['date'].isoformat(), "count": d['n']} for d in days]
 
         return Response({
-            "total_interactions": total,
-            "flagged_count": flagged_count,
+            "total_interactions": counts['total'],
+            "flagged_count": counts['flagged'],
             "by_scenario": by_scenario,
             "by_mood": by_mood,
             "last_7_days": last_7_days,
         }, status=status.HTTP_200_OK)
 
 
-def get_or_create_profile(user):
-    profile, _ = UserProfile.objects.get_or_create(user=user, defaults={"coins": 0})
-    return profile
-
-
 class ProfileView(APIView):
     """Returns the current user's coins and purchased reward ids."""
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile = get_or_create_profile(request.user)
+        profile = profile_cache.snapshot(request.user)
         return Response({
             "username": request.user.username,
-            "coins": profile.coins,
-            "purchased_reward_ids": profile.purchased_reward_ids,
+            "coins": profile["coins"],
+            "purchased_reward_ids": profile["purchased_reward_ids"],
         }, status=status.HTTP_200_OK)
 
 
 class AwardCoinsView(APIView):
-    """Award coins for kind moments or reaching a goal. Called by frontend."""
+    """Award coins for kind moments or reaching a goal. Called by frontend. Recorded in the coin ledger."""
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         amount = request.data.get("amount", 0)
         if not isinstance(amount, int) or amount <= 0 or amount > 100:
             return Response({"error": "Invalid amount"}, status=status.HTTP_400_BAD_REQUEST)
-        profile = get_or_create_profile(request.user)
-        profile.coins += amount
-        profile.save(update_fields=["coins"])
-        return Response({"coins": profile.coins, "awarded": amount}, status=status.HTTP_200_OK)
+        balance = coins.award(request.user, amount)
+        return Response({"coins": balance, "awarded": amount}, status=status.HTTP_200_OK)
 
 
 class ShopView(APIView):
-    """List available rewards."""
+    """List available rewards, with `owned` flags from the cached profile snapshot."""
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile = get_or_create_profile(request.user)
-        rewards = []
-        for r in REWARDS:
-            rewards.append({
-                **r,
-                "owned": r["id"] in (profile.purchased_reward_ids or []),
-            })
-        return Response({"rewards": rewards, "coins": profile.coins}, status=status.HTTP_200_OK)
+        profile = profile_cache.snapshot(request.user)
+        owned = profile["owned"]
+        rewards = ",".join(item[reward_id in owned] for reward_id, item in SHOP_ITEMS_JSON)
+        body = '{{"rewards":[{}],"coins":{}}}'.format(rewards, profile["coins"])
+        return HttpResponse(body, content_type="application/json")
 
 
 class RedeemRewardView(APIView):
-    """Spend coins to purchase a reward."""
+    """Spend coins to purchase a reward. The balance is only decremented if it covers the cost (see coins.py)."""
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         reward_id = request.data.get("reward_id")
         if not reward_id:
             return Response({"error": "reward_id required"}, status=status.HTTP_400_BAD_REQUEST)
-        reward = next((r for r in REWARDS if r["id"] == reward_id), None)
+        reward = REWARDS_BY_ID.get(reward_id) if isinstance(reward_id, str) else None
         if not reward:
             return Response({"error": "Unknown reward"}, status=status.HTTP_400_BAD_REQUEST)
-        profile = get_or_create_profile(request.user)
-        purchased = profile.purchased_reward_ids or []
-        if reward_id in purchased:
-            return Response({"error": "Already owned", "coins": profile.coins}, status=status.HTTP_400_BAD_REQUEST)
-        if profile.coins < reward["cost"]:
-            return Response({"error": "Not enough coins", "coins": profile.coins}, status=status.HTTP_400_BAD_REQUEST)
-        profile.coins -= reward["cost"]
-        purchased = list(purchased) + [reward_id]
-        profile.purchased_reward_ids = purchased
-        profile.save(update_fields=["coins", "purchased_reward_ids"])
+        profile = profile_cache.snapshot(request.user)
+        if reward_id in profile["owned"]:
+            return Response({"error": "Already owned", "coins": profile["coins"]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            balance, purchased = coins.redeem(request.user, reward)
+        except (coins.InsufficientCoins, coins.AlreadyOwned) as e:
+            return Response({"error": str(e), "coins": e.coins}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
-            "coins": profile.coins,
+            "coins": balance,
             "reward_id": reward_id,
-            "purchased_reward_ids": profile.purchased_reward_ids,
+            "purchased_reward_ids": purchased,
         }, status=status.HTTP_200_OK)
 
 
 class EndPracticeView(APIView):
-    """Log the current conversation as a practice session for parent review, then frontend resets chat."""
+    """
+    Log the current conversation as a practice session for parent review, then frontend resets chat.
+    With a `conversation_id` the server-held transcript is saved; when there is none, or it has
+    expired, the client-sent `messages` are saved instead.
+    The transcript is stored as one compressed blob when COMPACT_TRANSCRIPTS is on, else as message rows.
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         scenario = request.data.get('scenario', 'Grocery Store')
-        messages = request.data.get('messages')  # list of { sender, text, mood? }
-        total_messages = request.data.get('total_messages', 0)
-        kind_moments = request.data.get('kind_moments', 0)
-        flagged_count = request.data.get('flagged_count', 0)
-        hurt_moments = request.data.get('hurt_moments', 0)
+        conversation = conversations.load(request.data.get('conversation_id'), request.user)
+        if conversation is not None:
+            scenario = conversation["scenario"]
+            messages = conversations.transcript(conversation)
+        else:
+            messages = request.data.get('messages')  # list of { sender, text, mood? }
+        counts = {}
+        for field in ('total_messages', 'kind_moments', 'flagged_count', 'hurt_moments'):
+            try:
+                counts[field] = max(0, int(request.data.get(field) or 0))
+            except (TypeError, ValueError):
+                return Response({"error": "{} must be a number".format(field)}, status=status.HTTP_400_BAD_REQUEST)
 
         if not isinstance(messages, list):
             messages = []
-
-        session = PracticeSession.objects.create(
-            user=request.user,
-            scenario=scenario,
-            total_messages=total_messages,
-            kind_moments=kind_moments,
-            flagged_count=flagged_count,
-            hurt_moments=hurt_moments,
-        )
-        for i, m in enumerate(messages):
-            sender = (m.get('sender') or 'user').lower()
-            if sender not in ('user', 'assistant'):
-                continue
-            PracticeSessionMessage.objects.create(
-                session=session,
-                sender=sender,
-                text=(m.get('text') or '')[:4096],
-                mood=(m.get('mood') or '')[:16] if sender == 'assistant' else '',
-                order=i,
-            )
+        cleaned = transcripts.clean(messages)
+
+        # One transaction: no partial transcripts, and a single commit instead of one per message
+        with transaction.atomic():
+            if getattr(settings, 'COMPACT_TRANSCRIPTS', False):
+                session = PracticeSession.objects.create(
+                    user=request.user, scenario=scenario,
+                    transcript_blob=transcripts.encode([m for _, m in cleaned]), **counts
+                )
+            else:
+                session = PracticeSession.objects.create(user=request.user, scenario=scenario, **counts)
+                PracticeSessionMessage.objects.bulk_create([
+                    PracticeSessionMessage(session=session, order=i, **m) for i, m in cleaned
+                ])
+        if conversation is not None:
+            conversations.discard(conversation)
         return Response({
             "session_id": session.id,
             "message_count": len(messages),
         }, status=status.HTTP_200_OK)
 
 
+SESSION_LIST_FIELDS = (
+    'id', 'scenario', 'ended_at', 'total_messages', 'kind_moments', 'flagged_count', 'hurt_moments',
+)
+
+
+def encode_session_cursor(ended_at, session_id):
+    raw = "{}|{}".format(ended_at.isoformat(), session_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_session_cursor(cursor):
+    """(ended_at, id) from a cursor returned by SessionListView; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ended_at, session_id = raw.split('|')
+        ended_at = datetime.fromisoformat(ended_at)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+    if timezone.is_naive(ended_at):
+        raise ValueError("cursor timestamp has no timezone")
+    return ended_at, int(session_id)
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
 class SessionListView(APIView):
-    """List practice sessions for the authenticated user (parent review)."""
+    """
+    List practice sessions for the authenticated user (parent review), newest first.
+    Keyset-paginated on (ended_at, id): pass `next_cursor` back as `cursor` for older sessions.
+    Optional filters: `scenario`, `since` and `until` (YYYY-MM-DD, inclusive), `limit` (max 100).
+    """
     permission_classes = [IsAuthenticated]
+    default_limit = 50
+    max_limit = 100
 
     def get(self, request):
-        sessions = PracticeSession.objects.filter(user=request.user)[:50]
-        data = [
-            {
-                "id": s.id,
-                "scenario": s.scenario,
-                "ended_at": s.ended_at.isoformat(),
-                "total_messages": s.total_messages,
-                "kind_moments": s.kind_moments,
-                "flagged_count": s.flagged_count,
-                "hurt_moments": s.hurt_moments,
-            }
-            for s in sessions
-        ]
-        return Response({"sessions": data}, status=status.HTTP_200_OK)
+        params = request.query_params
+        try:
+            limit = min(max(int(params.get('limit') or self.default_limit), 1), self.max_limit)
+            since, until = _parse_date(params.get('since')), _parse_date(params.get('until'))
+            cursor = decode_session_cursor(params['cursor']) if params.get('cursor') else None
+        except ValueError:
+            return Response({"error": "Invalid limit, date or cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        sessions = PracticeSession.objects.filter(user=request.user)
+        if params.get('scenario'):
+            sessions = sessions.filter(scenario=params['scenario'])
+        # Date bounds as datetimes (not __date) so the (user, ended_at, id) index is usable
+        tz = timezone.get_current_timezone()
+        if since:
+            sessions = sessions.filter(ended_at__gte=datetime.combine(since, dt_time.min, tzinfo=tz))
+        if until:
+            sessions = sessions.filter(ended_at__lt=datetime.combine(until + timedelta(days=1), dt_time.min, tzinfo=tz))
+        if cursor:
+            ended_at, session_id = cursor
+            sessions = sessions.filter(Q(ended_at__lt=ended_at) | Q(ended_at=ended_at, id__lt=session_id))
+
+        # Fetch one extra row to know whether there is another page
+        rows = list(sessions.order_by('-ended_at', '-id').values(*SESSION_LIST_FIELDS)[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_session_cursor(rows[-1]['ended_at'], rows[-1]['id'])
+        for row in rows:
+            row['ended_at'] = row['ended_at'].isoformat()
+        return Response({"sessions": rows, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 
 class SessionDetailView(APIView):
@@ -265,10 +477,6 @@ class SessionDetailView(APIView):
         session = PracticeSession.objects.filter(user=request.user, id=session_id).first()
         if not session:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
-        messages = [
-            {"sender": m.sender, "text": m.text, "mood": m.mood or None}
-            for m in session.messages.all()
-        ]
         return Response({
             "id": session.id,
             "scenario": session.scenario,
@@ -277,39 +485,47 @@ class SessionDetailView(APIView):
             "kind_moments": session.kind_moments,
             "flagged_count": session.flagged_count,
             "hurt_moments": session.hurt_moments,
-            "messages": messages,
+            "messages": session.transcript,
         }, status=status.HTTP_200_OK)
 
 
 class TextToSpeechView(APIView):
-    """Proxy to ElevenLabs TTS. Keeps API key on server. Set ELEVENLABS_API_KEY and optionally ELEVENLABS_VOICE_ID in .env."""
+    """
+    Proxy to ElevenLabs TTS. Keeps API key on server. Set ELEVENLABS_API_KEY and optionally ELEVENLABS_VOICE_ID in .env.
+    Clips are cached on disk by (voice, model, format, text); the cache key doubles as a strong ETag.
+    With TTS_STREAMING on, a cache miss is relayed chunk by chunk as ElevenLabs produces it
+    (through an async iterator under ASGI).
+    """
     permission_classes = [AllowAny]
 
+    def get(self, request):
+        return self.post(request)
+
     def post(self, request):
-        api_key = os.environ.get("ELEVENLABS_API_KEY", "").strip()
-        voice_id = os.environ.get("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM").strip()  # Rachel (default)
+        api_key = tts.get_api_key()
+        voice_id = tts.get_voice_id()
         if not api_key:
             return Response({"error": "ElevenLabs API key not configured"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        text = (request.data.get("text") or request.query_params.get("text") or "").strip()[:500]
+        text = tts.normalize_text(request.data.get("text") or request.query_params.get("text"))
         if not text:
             return Response({"error": "text required"}, status=status.HTTP_400_BAD_REQUEST)
-        url = "https://api.elevenlabs.io/v1/text-to-speech/{}?output_format=mp3_44100_128".format(voice_id)
-        payload = json.dumps({"text": text, "model_id": "eleven_multilingual_v2"}).encode("utf-8")
-        req = Request(
-            url,
-            data=payload,
-            headers={
-                "xi-api-key": api_key,
-                "Content-Type": "application/json",
-                "Accept": "audio/mpeg",
-            },
-            method="POST",
-        )
+        etag = '"{}"'.format(tts.cache_key(text, voice_id))
+        if request.headers.get("If-None-Match") == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
         try:
-            with urlopen(req, timeout=15) as resp:
-                audio_bytes = resp.read()
+            audio, hit = tts.cached_speech(text, voice_id, api_key, stream=settings.TTS_STREAMING)
         except HTTPError as e:
             return Response({"error": "TTS failed", "detail": str(e.code)}, status=status.HTTP_502_BAD_GATEWAY)
         except URLError as e:
             return Response({"error": "TTS failed", "detail": str(e.reason)}, status=status.HTTP_502_BAD_GATEWAY)
-        return HttpResponse(audio_bytes, content_type="audio/mpeg")
+        if isinstance(audio, bytes):
+            response = HttpResponse(audio, content_type="audio/mpeg")
+        else:
+            response = StreamingHttpResponse(_iterate_in_thread(audio) if _is_asgi(request) else audio,
+                                             content_type="audio/mpeg")
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+        response["X-TTS-Cache"] = "HIT" if hit else "MISS"
+        return response
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve with an ASGI server (e.g. ``uvicorn sociable_backend.asgi:application --workers 2``)
+to use the async chat endpoint at /api/chat/async/, which awaits the Mistral
+async client instead of holding a worker thread per conversation. The sync
+DRF endpoints keep working under ASGI (Django runs them in a thread).
 """
 
 import os
@@ -10,8 +10,15 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'simulator.middleware.MetricsMiddleware',
+    'simulator.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'simulator.middleware.RequestDeadlineMiddleware',
 ]
 
 ROOT_URLCONF = 'sociable_backend.urls'
@@ -78,12 +88,58 @@ WSGI_APPLICATION = 'sociable_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the database:
+#   sqlite          (default) WAL journal, synchronous=NORMAL, busy timeout and mmap, set on each
+#                   connection; write transactions start IMMEDIATE so concurrent writers queue on
+#                   the busy timeout instead of failing with "database is locked"
+#   sqlite-default  Django's stock SQLite settings (rollback journal), for comparison
+#   postgres        POSTGRES_DB / _USER / _PASSWORD / _HOST / _PORT; persistent connections for
+#                   DB_CONN_MAX_AGE seconds, or a psycopg connection pool with DB_POOL=1
+DB_PROFILE = os.getenv('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'sociable'),
+        'USER': os.getenv('POSTGRES_USER', 'sociable'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
-}
+    if os.getenv('DB_POOL') == '1':
+        # Needs psycopg[pool]; Django does not allow CONN_MAX_AGE together with a pool
+        _postgres['CONN_MAX_AGE'] = 0
+        _postgres['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '20')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }
+    else:
+        _postgres['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+    DATABASES = {'default': _postgres}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # File-backed test database: the in-memory one uses shared-cache table locks, which fail
+            # immediately instead of waiting, so the threaded coin ledger tests could not run on it
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+    if DB_PROFILE != 'sqlite-default':
+        DATABASES['default']['OPTIONS'] = {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'  # 256 MB
+                'PRAGMA cache_size=-16000;'  # 16 MB
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,  # busy timeout, seconds
+        }
 
 
 # Password validation
@@ -132,9 +188,70 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with a short-lived token -> user cache (AUTH_TOKEN_CACHE_TTL)
+        'simulator.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ]
-}
\ No newline at end of file
+}
+
+# ElevenLabs TTS audio cache (simulator/tts.py): content-addressed clips, LRU-evicted past the size bound
+TTS_CACHE_DIR = BASE_DIR / 'tts_cache'
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Relay cache misses from the ElevenLabs streaming endpoint instead of buffering the whole clip
+TTS_STREAMING = True
+ELEVENLABS_BASE_URL = 'https://api.elevenlabs.io'
+
+# Outbound calls (simulator/http_client.py): shared per-request time budget, per-call
+# timeouts, jittered retries on 429/5xx, and a cap on concurrent connections per upstream
+REQUEST_BUDGET_SECONDS = 30
+LLM_TIMEOUT_SECONDS = 20
+OUTBOUND_MAX_CONNECTIONS = 16
+OUTBOUND_POOL_TIMEOUT_SECONDS = 5
+OUTBOUND_MAX_ATTEMPTS = 3
+OUTBOUND_RETRY_BASE_SECONDS = 0.25
+OUTBOUND_RETRY_MAX_SECONDS = 4.0
+
+# Vibe-check verdict cache (simulator/vibe_cache.py), stored in the default Django cache
+VIBE_CACHE_TTL = 24 * 60 * 60
+VIBE_EXTRA_BLOCKED_WORDS = []
+# Suggestion chips cached per (scenario, character reply) (simulator/suggestions_cache.py)
+SUGGESTIONS_CACHE_TTL = 7 * 24 * 60 * 60
+# Server-held chat conversations (simulator/conversations.py) are stored in the Conversation table
+# and expire this long after the last turn
+CONVERSATION_TTL = 6 * 60 * 60
+# Prompt history (simulator/context.py): recent turns up to this many tokens, older ones summarized
+HISTORY_TOKEN_BUDGET = 600
+SUMMARY_BATCH_TURNS = 6
+# Store each practice transcript as one compressed blob on PracticeSession (simulator/transcripts.py)
+# instead of a PracticeSessionMessage row per line. Migration 0006 compacts existing transcripts;
+# to keep rows, set this to False and run `manage.py convert_transcripts --to rows`
+COMPACT_TRANSCRIPTS = True
+# Cached per-user coins/purchases snapshot for /profile/ and /shop/ (simulator/profile_cache.py),
+# retired whenever coins are awarded or spent. Like the token cache below, only used when
+# CACHES['default'] is shared between processes
+PROFILE_CACHE_TTL = 5 * 60
+# Resolved token -> user lookups are cached this many seconds (simulator/authentication.py);
+# revoked tokens and changed users are invalidated immediately. Only used when CACHES['default']
+# is shared between processes (not the per-process LocMemCache), since invalidation must reach all
+AUTH_TOKEN_CACHE_TTL = 60
+# Chat analytics logs are queued and bulk-written by a background thread (simulator/log_writer.py)
+# every LOG_WRITER_BATCH_SIZE rows or LOG_WRITER_FLUSH_MS ms; when LOG_WRITER_MAX_QUEUE rows are
+# waiting, LOG_WRITER_OVERFLOW 'sync' writes on the request thread and 'drop' discards the row
+INTERACTION_LOG_BUFFERED = True
+LOG_WRITER_BATCH_SIZE = 100
+LOG_WRITER_FLUSH_MS = 200
+LOG_WRITER_MAX_QUEUE = 10000
+LOG_WRITER_OVERFLOW = 'sync'
+# Per-request stage timings, LLM tokens and cache results (simulator/metrics.py), scraped from
+# /metrics with `Authorization: Bearer <METRICS_TOKEN>` (without a token /metrics is refused unless
+# DEBUG is on); SERVER_TIMING adds them as a Server-Timing header
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+SERVER_TIMING = DEBUG
+# Sampled request profiling (simulator/profiling.py): this fraction of requests records SQL query
+# counts, time and duplicates (plus a cProfile dump per endpoint with PROFILING_CPROFILE) under
+# PROFILING_DIR; summarize with `manage.py profile_report`. 0 leaves the middleware out entirely
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_CPROFILE = os.getenv('PROFILING_CPROFILE', '0') == '1'
+PROFILING_DIR = BASE_DIR / 'profiles'